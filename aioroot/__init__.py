@@ -1,10 +1,37 @@
+from .trace import Stats, tracer
+from .source import ByteSource, LocalFile
+from .cache import BlockCache, shared_cache
+from .scheduler import IOScheduler, shared_scheduler, bulk_reads
+from .deadline import deadline
 from .xrootd import XRootDFile
+from .metacache import MetadataCache
 from .rootfile import ROOTFile
+from .bulk import fetch, numentries
+from .dataset import Dataset
+from . import sync, sharded
+from .sharded import scan
 from .version import __version__
 
 
 __all__ = [
+    'Stats',
+    'tracer',
+    'ByteSource',
+    'LocalFile',
+    'BlockCache',
+    'shared_cache',
+    'IOScheduler',
+    'shared_scheduler',
+    'bulk_reads',
+    'deadline',
     'XRootDFile',
+    'MetadataCache',
     'ROOTFile',
+    'fetch',
+    'numentries',
+    'Dataset',
+    'sync',
+    'sharded',
+    'scan',
     '__version__',
 ]
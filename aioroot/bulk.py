@@ -0,0 +1,56 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .rootfile import ROOTFile
+from .deadline import deadline
+
+
+async def _fetch_one(url, keyname, threadpool, transform, timeout, options):
+    try:
+        with deadline(timeout):
+            async with ROOTFile(url, threadpool=threadpool, **options) as file:
+                obj = await file[keyname]
+        return url, obj if transform is None else transform(obj)
+    except Exception as exc:
+        return url, exc
+
+
+async def fetch(urls, keyname, concurrency=32, threadpool=None, transform=None, timeout=None, **options):
+    '''Read keyname from each of urls, yielding (url, object) as each file completes
+
+    At most concurrency files are open at any time, and all of them share one
+    decompression threadpool (a private one is made if none is given).  As with
+    asyncio.gather(return_exceptions=True), a file that fails yields its exception
+    in place of the object and does not interrupt the others.  If given, transform
+    is applied to each object before it is yielded, so that only the needed part
+    is kept.  A file not read within timeout seconds yields asyncio.TimeoutError,
+    its reads are cancelled and its handle closed.  Extra keyword arguments are
+    passed to ROOTFile.
+    '''
+    ownpool = None
+    if threadpool is None:
+        threadpool = ownpool = ThreadPoolExecutor()
+    pending = set()
+    try:
+        for url in urls:
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            pending.add(asyncio.ensure_future(_fetch_one(url, keyname, threadpool, transform, timeout, options)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if ownpool is not None:
+            ownpool.shutdown(wait=False)
+
+
+def numentries(urls, treename, **kwargs):
+    '''Yield (url, number of entries in treename) as each file completes
+
+    See fetch for the keyword arguments.
+    '''
+    return fetch(urls, treename, transform=lambda tree: tree.data['fEntries'], **kwargs)
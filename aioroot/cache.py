@@ -0,0 +1,151 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from .scheduler import io_priority, BULK
+
+
+class BlockCache:
+    '''Block-aligned LRU read cache shared between byte sources
+
+    Blocks are keyed by (url, block index) and evicted least-recently-used
+    once the byte budget is exceeded.  Readers of a block that is already
+    being fetched wait on that fetch rather than issuing their own, and the
+    fetch is cancelled if all of them are.  Bulk payload reads (see
+    aioroot.bulk_reads, e.g. the baskets of read_array) and any read larger
+    than bypass_size go straight to the source, so that payload is neither
+    copied into blocks nor flushes the metadata out of the cache.
+
+    Blocks are shared by all event loops of the process, but in-flight fetches
+    are keyed by loop too, as a task can only be awaited from its own loop.
+    '''
+    def __init__(self, maxbytes=32 * 1024 * 1024, blocksize=64 * 1024, bypass_size=1024 * 1024):
+        self.maxbytes = maxbytes
+        self.blocksize = blocksize
+        self.bypass_size = bypass_size
+        self._blocks = OrderedDict()
+        # guards _blocks against loops running in other threads
+        self._lock = threading.Lock()
+        # (loop, url, block index): fetch task
+        self._inflight = {}
+        # number of readers waiting on each in-flight fetch task
+        self._readers = {}
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'shared': self.shared,
+            'evictions': self.evictions,
+            'blocks': len(self._blocks),
+            'nbytes': self._nbytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self._nbytes = 0
+
+    def _insert(self, key, block):
+        with self._lock:
+            if key in self._blocks:
+                self._nbytes -= len(self._blocks.pop(key))
+            self._blocks[key] = block
+            self._nbytes += len(block)
+            while self._nbytes > self.maxbytes and self._blocks:
+                _, old = self._blocks.popitem(last=False)
+                self._nbytes -= len(old)
+                self.evictions += 1
+
+    async def _fetch(self, loop, url, first, last, fetch):
+        bs = self.blocksize
+        try:
+            data = memoryview(await fetch(first * bs, (last - first + 1) * bs))
+        finally:
+            for i in range(first, last + 1):
+                del self._inflight[(loop, url, i)]
+        blocks = {}
+        for i in range(first, last + 1):
+            block = bytes(data[(i - first) * bs:(i - first + 1) * bs])
+            if not block:
+                break
+            self._insert((url, i), block)
+            blocks[i] = block
+        return blocks
+
+    async def read(self, url, offset, size, fetch):
+        '''Read through the cache, calling fetch(offset, size) for missing blocks'''
+        if size > self.bypass_size or io_priority.get() == BULK:
+            return await fetch(offset, size)
+        if size <= 0:
+            return b''
+        bs = self.blocksize
+        first, last = offset // bs, (offset + size - 1) // bs
+        found = await self._lookup(url, first, last, fetch)
+        start = offset - first * bs
+        if first == last:
+            return memoryview(found.get(first, b''))[start:start + size]
+        data = b''.join(found.get(i, b'') for i in range(first, last + 1))
+        return memoryview(data)[start:start + size]
+
+    async def _lookup(self, url, first, last, fetch):
+        '''{index: block} for blocks first to last, fetching missing runs and sharing in-flight ones'''
+        loop = asyncio.get_running_loop()
+        found = {}
+        tasks = {}
+        missing = []
+        with self._lock:
+            for i in range(first, last + 1):
+                key = (url, i)
+                block = self._blocks.get(key)
+                if block is not None:
+                    self._blocks.move_to_end(key)
+                    found[i] = block
+                    self.hits += 1
+                elif (loop, url, i) in self._inflight:
+                    task = self._inflight[(loop, url, i)]
+                    tasks[id(task)] = task
+                    self.shared += 1
+                else:
+                    missing.append(i)
+                    self.misses += 1
+
+        runs = []
+        for i in missing:
+            if runs and runs[-1][1] == i - 1:
+                runs[-1][1] = i
+            else:
+                runs.append([i, i])
+        for start, stop in runs:
+            task = asyncio.ensure_future(self._fetch(loop, url, start, stop, fetch))
+            for i in range(start, stop + 1):
+                self._inflight[(loop, url, i)] = task
+            tasks[id(task)] = task
+
+        if tasks:
+            for task in tasks.values():
+                self._readers[task] = self._readers.get(task, 0) + 1
+            try:
+                # shield so that one cancelled reader does not fail the others sharing the fetch
+                for blocks in await asyncio.gather(*(asyncio.shield(t) for t in tasks.values())):
+                    found.update(blocks)
+            finally:
+                for task in tasks.values():
+                    self._readers[task] -= 1
+                    if not self._readers[task]:
+                        del self._readers[task]
+                        if not task.done():
+                            # the last reader gave up, so does the fetch
+                            task.cancel()
+        return found
+
+
+shared_cache = BlockCache()
@@ -0,0 +1,122 @@
+import os
+import numpy
+from .bulk import fetch
+
+
+def _index(tree):
+    return tree.clusters()
+
+
+class Dataset:
+    '''Entry index of a TTree across a list of files
+
+    offsets holds the global entry number of the first entry of each file,
+    with the total number of entries appended, so that a global entry is
+    found by binary search.  The cluster boundaries of every file (see
+    TTree.clusters) are kept in one flat array, those of file i being
+    clusters[cluster_offsets[i]:cluster_offsets[i + 1]], so that work can be
+    split on cluster boundaries without opening any file again.  The index
+    is saved with save and read back with Dataset.load.
+    '''
+    def __init__(self, treename):
+        self.treename = treename
+        self.urls = []
+        self.offsets = numpy.zeros(1, dtype=numpy.int64)
+        self.clusters = numpy.zeros(0, dtype=numpy.int64)
+        self.cluster_offsets = numpy.zeros(1, dtype=numpy.int64)
+        self._known = set()
+
+    def __len__(self):
+        return len(self.urls)
+
+    @property
+    def numentries(self):
+        return int(self.offsets[-1])
+
+    async def add(self, urls, **kwargs):
+        '''Read the trees of the urls not already indexed, concurrently, and append them
+
+        Files are appended in the order given.  Keyword arguments are passed to
+        aioroot.fetch.  Files that fail are left out, and returned as {url: exception}.
+        '''
+        urls = [url for url in dict.fromkeys(urls) if url not in self._known]
+        found = {}
+        failed = {}
+        async for url, result in fetch(urls, self.treename, transform=_index, **kwargs):
+            if isinstance(result, BaseException):
+                failed[url] = result
+            else:
+                found[url] = result
+        self._append([(url, found[url]) for url in urls if url in found])
+        return failed
+
+    def _append(self, files):
+        if not files:
+            return
+        urls = [url for url, _ in files]
+        entries = numpy.array([bounds[-1] for _, bounds in files], dtype=numpy.int64)
+        sizes = numpy.array([len(bounds) for _, bounds in files], dtype=numpy.int64)
+        self._known.update(urls)
+        self.urls.extend(urls)
+        self.offsets = numpy.concatenate([self.offsets, self.offsets[-1] + numpy.cumsum(entries)])
+        self.clusters = numpy.concatenate([self.clusters] + [numpy.asarray(bounds, dtype=numpy.int64) for _, bounds in files])
+        self.cluster_offsets = numpy.concatenate([self.cluster_offsets, self.cluster_offsets[-1] + numpy.cumsum(sizes)])
+
+    def file_clusters(self, index):
+        '''Local cluster boundaries of file index'''
+        return self.clusters[self.cluster_offsets[index]:self.cluster_offsets[index + 1]]
+
+    def locate(self, entry):
+        '''Return (url, local entry) of a global entry number'''
+        if not 0 <= entry < self.numentries:
+            raise IndexError("Entry %d out of range for %d entries" % (entry, self.numentries))
+        index = int(numpy.searchsorted(self.offsets, entry, side='right')) - 1
+        return self.urls[index], int(entry - self.offsets[index])
+
+    def locate_array(self, entries):
+        '''Return (file index, local entry) arrays for an array of global entry numbers'''
+        entries = numpy.asarray(entries, dtype=numpy.int64)
+        if entries.size and (entries.min() < 0 or entries.max() >= self.numentries):
+            raise IndexError("Entries out of range for %d entries" % self.numentries)
+        index = numpy.searchsorted(self.offsets, entries, side='right') - 1
+        return index, entries - self.offsets[index]
+
+    def partition(self, step):
+        '''Yield (url, entry_start, entry_stop) work units of at least step entries
+
+        Units never cross a file or cluster boundary, the last unit of a file
+        may be smaller than step.
+        '''
+        for index, url in enumerate(self.urls):
+            bounds = self.file_clusters(index)
+            start = bounds[0]
+            for stop in bounds[1:]:
+                if stop - start >= step or stop == bounds[-1]:
+                    yield url, int(start), int(stop)
+                    start = stop
+
+    def save(self, path):
+        '''Write the index to path as a NumPy .npz archive, replacing it atomically'''
+        tmppath = path + '.tmp'
+        with open(tmppath, 'wb') as fout:
+            numpy.savez_compressed(
+                fout,
+                treename=numpy.array(self.treename),
+                urls=numpy.array(self.urls, dtype=str),
+                offsets=self.offsets,
+                clusters=self.clusters,
+                cluster_offsets=self.cluster_offsets,
+            )
+        os.replace(tmppath, path)
+
+    @classmethod
+    def load(cls, path):
+        '''Read an index written by save, which can then be extended with add'''
+        with numpy.load(path) as archive:
+            dataset = cls(archive['treename'].item())
+            dataset.urls = archive['urls'].tolist()
+            dataset.offsets = archive['offsets']
+            dataset.clusters = archive['clusters']
+            dataset.cluster_offsets = archive['cluster_offsets']
+        dataset._known = set(dataset.urls)
+        return dataset
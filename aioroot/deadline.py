@@ -0,0 +1,71 @@
+import math
+import time
+import asyncio
+import contextvars
+
+# time.monotonic() by which the operations of the current context must finish, None for no limit
+current_deadline = contextvars.ContextVar('aioroot_deadline', default=None)
+
+
+def remaining():
+    '''Seconds left before the current deadline, None if there is none'''
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def request_timeout(timeout):
+    '''An xrootd request timeout (whole seconds, at least 1) no later than the current deadline'''
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(1, min(timeout, math.ceil(left)))
+
+
+class deadline:
+    '''Context manager cancelling the enclosing task if its block takes longer than seconds
+
+    The expired block raises asyncio.TimeoutError.  Reads made inside it, and in
+    tasks started from it, see the deadline: xrootd requests are given no more
+    time than is left and threadpool work still queued when it passes is
+    skipped.  Nested deadlines keep the earliest.  seconds=None is no limit.
+    '''
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expired = False
+        self._handle = None
+        self._token = None
+        self._task = None
+
+    def __enter__(self):
+        if self.seconds is None:
+            return self
+        when = time.monotonic() + self.seconds
+        outer = current_deadline.get()
+        if outer is not None and outer <= when:
+            # the enclosing deadline fires first and cancels the task itself
+            return self
+        self._task = asyncio.current_task() if hasattr(asyncio, 'current_task') else asyncio.Task.current_task()
+        if self._task is None:
+            raise RuntimeError("aioroot.deadline must be used inside a task")
+        self._token = current_deadline.set(when)
+        self._handle = asyncio.get_event_loop().call_later(max(self.seconds, 0), self._expire)
+        return self
+
+    def _expire(self):
+        self.expired = True
+        self._task.cancel()
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is None:
+            return False
+        self._handle.cancel()
+        current_deadline.reset(self._token)
+        self._token = None
+        if self.expired:
+            if hasattr(self._task, 'uncancel'):
+                self._task.uncancel()
+            if exc_type is asyncio.CancelledError:
+                raise asyncio.TimeoutError("Deadline of %g s exceeded" % self.seconds) from exc
+        return False
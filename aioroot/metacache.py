@@ -0,0 +1,98 @@
+import time
+import sqlite3
+import weakref
+import threading
+
+
+class MetadataCache:
+    '''Persistent on-disk cache of the metadata ROOTFile.open reads
+
+    The raw file header, root directory and keys list bytes are stored in an
+    SQLite database keyed by url, along with the size and modification time
+    reported by the byte source.  An entry is only used if the current stat of
+    the file matches both, which the byte source can answer without a round
+    trip.  A file rewritten in place with the same size within the same second
+    is not noticed.  Every cold open replaces the entry.
+
+    get and put block on the database, ROOTFile calls them in the default
+    executor.  Writes are committed together, once commit_every are pending
+    or commit_interval seconds after the last commit, and by flush or close.
+    '''
+    # bumped whenever the table changes, older tables are dropped
+    version = 2
+    schema = '''CREATE TABLE IF NOT EXISTS metadata (
+        url TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        modtime INTEGER NOT NULL,
+        head BLOB NOT NULL,
+        keys BLOB NOT NULL
+    )'''
+
+    def __init__(self, path, commit_every=64, commit_interval=1.):
+        self._path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        # several processes scanning the same dataset may share one cache file,
+        # write-ahead logging lets them read while another writes
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        with self._db:
+            if self._db.execute('PRAGMA user_version').fetchone()[0] != self.version:
+                self._db.execute('DROP TABLE IF EXISTS metadata')
+                self._db.execute('PRAGMA user_version = %d' % self.version)
+            self._db.execute(self.schema)
+        # one connection used from executor threads
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._lastcommit = time.monotonic()
+        # uncommitted writes are not lost if the cache is dropped without close
+        self._finalizer = weakref.finalize(self, _commit, self._db, self._lock)
+        self.hits = 0
+        self.misses = 0
+
+    def __reduce__(self):
+        # sent to scan workers as its path, each process opens its own connection
+        return type(self), (self._path,)
+
+    def flush(self):
+        '''Commit the pending writes'''
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+            self._lastcommit = time.monotonic()
+
+    def close(self):
+        self._finalizer.detach()
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def get(self, url, stat):
+        '''Return (headbytes, keysbytes) if the entry for url matches stat, else None'''
+        with self._lock:
+            row = self._db.execute('SELECT size, modtime, head, keys FROM metadata WHERE url = ?', (url,)).fetchone()
+        if row is None or row[0] != stat['size'] or row[1] != stat['modtime']:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[2], row[3]
+
+    def put(self, url, stat, headbytes, keysbytes):
+        row = (url, stat['size'], stat['modtime'], bytes(headbytes), bytes(keysbytes))
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO metadata (url, size, modtime, head, keys) VALUES (?, ?, ?, ?, ?)', row)
+            self._pending += 1
+            if self._pending < self.commit_every and time.monotonic() - self._lastcommit < self.commit_interval:
+                return
+            self._db.commit()
+            self._pending = 0
+            self._lastcommit = time.monotonic()
+
+
+def _commit(db, lock):
+    with lock:
+        try:
+            db.commit()
+        except sqlite3.ProgrammingError:
+            # already closed
+            pass
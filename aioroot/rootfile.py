@@ -1,23 +1,56 @@
+import time
 import asyncio
 import warnings
+import collections
+import numpy
 from functools import partial
 from concurrent.futures import ThreadPoolExecutor
-from .xrootd import XRootDFile
+from .source import ByteSource, source_for
 from .structure import (
     ROOTObject,
     TFile,
     TKey,
     TDirectory,
+    TDirectoryFile,
     TKeyList,
+    TBasket,
+    TList,
+    TStreamerInfo,
+    Compression,
     CompressionHeader,
     ClassMap,
+    ObjectContext,
 )
+from .streamers import StreamerSet, StreamedObject
+from .trace import tracer
+from .scheduler import shared_scheduler, bulk_reads, BULK
+from .deadline import deadline, current_deadline
+
+
+class _Unlimited:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
 
 
 class ROOTFile:
-    def __init__(self, url, threadpool=None):
-        self._file = XRootDFile(url)
+    def __init__(self, url, threadpool=None, open_tailsize=None, metacache=None, scheduler=shared_scheduler, timeout=None):
+        # a preconfigured ByteSource can be passed in place of the url
+        self._file = url if isinstance(url, ByteSource) else source_for(url)
         self._open_readstep = 512  # ROOT uses 300
+        # if set, read this much from the end of the file concurrently with the head
+        # ROOT writes the keys list just before fEND so it is usually found there
+        self._open_tailsize = open_tailsize
+        self._open_windows = []
+        self.open_roundtrips = 0
+        # optional MetadataCache to skip the metadata reads on warm opens
+        self._metacache = metacache
+        # IOScheduler bounding the bytes of objects and baskets read but not yet unpacked, None to disable
+        self._scheduler = scheduler
+        # seconds allowed for each of open, reading an object and reading an array, None for no limit
+        self._timeout = timeout
         self._ownpool = None
         self._threadpool = threadpool
         if threadpool is None:
@@ -26,22 +59,101 @@ class ROOTFile:
         self.rootkey = TKey()
         self.rootdir = TDirectory()
         self.keyslist = TKeyList()
+        self._streamers = None
+        self._streamersread = None
+        # TKey of a subdirectory: task reading it, shared by concurrent and later lookups
+        self._directories = {}
+
+    def _buffer(self, nbytes, priority=None):
+        '''Async context manager holding nbytes of the scheduler buffer budget'''
+        if self._scheduler is None:
+            return _Unlimited()
+        return self._scheduler.buffer(nbytes, priority)
 
     async def _run_in_pool(self, fun, *args):
-        return await asyncio.get_event_loop().run_in_executor(self._threadpool, fun, *args)
+        name = getattr(fun, '__qualname__', None) or type(fun).__name__
+        queued = tracer.span('pool.wait', self.stats, function=name)
+        # work still queued once its caller is cancelled is dropped by the executor,
+        # work still queued past the deadline is skipped here
+        expires = current_deadline.get()
+
+        def run():
+            queued.finish()
+            if expires is not None and time.monotonic() > expires:
+                raise asyncio.TimeoutError("Deadline passed before %s started" % name)
+            with tracer.span('pool.run', self.stats, function=name):
+                return fun(*args)
+
+        return await asyncio.get_event_loop().run_in_executor(self._threadpool, run)
+
+    @property
+    def stats(self):
+        '''Counters and latency histograms of the trace spans of this file, see aioroot.trace'''
+        return self._file.stats
+
+    async def _open_read(self, offset, size):
+        '''Read during open, served from the prefetched windows if they cover the range'''
+        for start, window in self._open_windows:
+            if start <= offset and offset + size <= start + len(window):
+                return memoryview(window)[offset - start:offset - start + size]
+        self.open_roundtrips += 1
+        return await self._file.read(offset, size)
+
+    async def _open_head(self):
+        self.open_roundtrips += 1
+        if self._open_tailsize is None:
+            return await self._file.read(0, self._open_readstep)
+
+        # stat is answered from the open response, no extra round trip
+        filesize = (await self._file.stat())['size']
+        if filesize <= self._open_readstep + self._open_tailsize:
+            return await self._file.read(0, filesize)
+        tailstart = filesize - self._open_tailsize
+        headbytes, tailbytes = await asyncio.gather(
+            self._file.read(0, self._open_readstep),
+            self._file.read(tailstart, self._open_tailsize),
+        )
+        self._open_windows.append((tailstart, tailbytes))
+        return headbytes
+
+    def _read_head(self, headbytes):
+        offset = self.fileheader.read(headbytes)
+        offset = self.rootkey.read(headbytes, offset)
+        return self.rootdir.read(headbytes, offset)
 
     async def open(self):
         if self._ownpool is not None:
             self._threadpool = self._ownpool()
-        await self._file.open()
+        with tracer.span('open', self.stats, url=self._file.url) as span, deadline(self._timeout):
+            try:
+                await self._file.open()
+                await self._read_metadata()
+                span.attrs['roundtrips'] = self.open_roundtrips
+                return self
+            except BaseException:
+                # release the handle, bulk scans would otherwise leak one per bad file
+                await self.close()
+                raise
 
-        headbytes = await self._file.read(0, self._open_readstep)
+    async def _read_metadata(self):
+        self.open_roundtrips = 0
+        stat = None
+        if self._metacache is not None:
+            stat = await self._file.stat()
+            cached = await asyncio.get_running_loop().run_in_executor(None, self._metacache.get, self._file.url, stat)
+            if cached is not None:
+                headbytes, keysbytes = cached
+                self._read_head(headbytes)
+                self.keyslist.read(keysbytes)
+                return self
+
+        headbytes = await self._open_head()
 
         offset = self.fileheader.read(headbytes)
         if offset + self.rootkey.minsize() > len(headbytes):
             warnings.warn("Readahead too small in file open to reach root key", RuntimeWarning)
             more = max(offset + self.rootkey.minsize() - len(headbytes), self._open_readstep)
-            headbytes = headbytes + (await self._file.read(len(headbytes), more))
+            headbytes = b''.join((headbytes, await self._open_read(len(headbytes), more)))
 
         offset = self.rootkey.read(headbytes, offset)
         if self.rootkey.data['fSeekKey'] != self.fileheader.data['fBEGIN']:
@@ -49,12 +161,19 @@ class ROOTFile:
         if offset + self.rootkey.data['fObjlen'] > len(headbytes):
             warnings.warn("Readahead too small in file open to reach end of root directory header", RuntimeWarning)
             more = offset + self.rootkey.data['fObjlen'] - len(headbytes)
-            headbytes = headbytes + (await self._file.read(len(headbytes), more))
+            headbytes = b''.join((headbytes, await self._open_read(len(headbytes), more)))
 
         offset = self.rootdir.read(headbytes, offset)
-        keysbytes = await self._file.read(self.rootdir.data['fSeekKeys'], self.rootdir.data['fNbytesKeys'])
+        self._open_windows.append((0, headbytes))
+        keysbytes = await self._open_read(self.rootdir.data['fSeekKeys'], self.rootdir.data['fNbytesKeys'])
+        self._open_windows = []
 
-        offset = self.keyslist.read(keysbytes)
+        self.keyslist.read(keysbytes)
+        if self._metacache is not None:
+            # the database may be busy with other processes, keep it off the loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._metacache.put, self._file.url, stat, memoryview(headbytes)[:offset], keysbytes,
+            )
         return self
 
     async def close(self):
@@ -89,16 +208,267 @@ class ROOTFile:
         return dig(data)
 
     async def __getitem__(self, key):
-        key = self.keyslist[key]
-        obj = ClassMap[key.data['fClassName']]()
-        # worth reading key at object? not doing now
-        objbytes = await self._file.read(key.data['fSeekKey'] + key.data['fKeylen'], key.data['fNbytes'] - key.data['fKeylen'])
+        '''Read the object for a key, which may be a path through subdirectories (b"dir/sub/name")'''
+        with deadline(self._timeout):
+            return await self._get(*(await self._locate(key)))
+
+    async def _locate(self, path):
+        '''Return the keys list holding the last part of a path, and that part'''
+        keyslist = self.keyslist
+        *dirnames, keyname = path.strip(b'/').split(b'/')
+        for dirname in dirnames:
+            directory = await self._get(keyslist, dirname)
+            if not isinstance(directory, TDirectoryFile):
+                raise KeyError("%r in %r is not a directory" % (dirname, path))
+            keyslist = directory.keyslist
+        return keyslist, keyname
+
+    async def _get(self, keyslist, keyname):
+        key = keyslist[keyname]
+        if ClassMap.get(key.data['fClassName']) is not TDirectoryFile:
+            return await self._read_key(key)
+        task = self._directories.get(key)
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            task = self._directories[key] = asyncio.ensure_future(self._read_key(key))
+        return await asyncio.shield(task)
+
+    async def _read_key(self, key):
+        span = tracer.span('get', self.stats, url=self._file.url, key=key.namecycle, classname=key.data['fClassName'], size=key.data['fNbytes'])
+        nbytes = key.data['fNbytes'] + (key.data['fObjlen'] if key.compressed else 0)
+        async with self._buffer(nbytes):
+            with span:
+                # worth reading key at object? not doing now
+                objbytes = await self._file.read(key.data['fSeekKey'] + key.data['fKeylen'], key.data['fNbytes'] - key.data['fKeylen'])
+                return await self._read_object(key, objbytes)
+
+    async def walk(self):
+        '''Yield (path, keyslist) for every directory, breadth first
 
+        The keys lists of all subdirectories at one depth are read concurrently.
+        The top directory has path b''.
+        '''
+        level = [(b'', self.keyslist)]
+        while level:
+            subdirs = []
+            for path, keyslist in level:
+                yield path, keyslist
+                names = dict.fromkeys(
+                    name for name, classname in zip(keyslist.names, keyslist.classnames)
+                    if ClassMap.get(classname) is TDirectoryFile
+                )
+                subdirs.extend((path + b'/' + name if path else name, keyslist, name) for name in names)
+            directories = await asyncio.gather(*(self._get(keyslist, name) for _, keyslist, name in subdirs))
+            level = [(path, directory.keyslist) for (path, _, _), directory in zip(subdirs, directories)]
+
+    async def _read_object(self, key, objbytes):
+        classname = key.data['fClassName']
+        cls = ClassMap.get(classname)
+        if cls is None:
+            cls = (await self.streamers()).classfor(classname)
+            if cls is None:
+                raise KeyError("No reader or streamer for class %r" % classname)
         if key.compressed:
-            cheader = CompressionHeader()
-            offset = cheader.read(objbytes)
-            objbytes = await self._run_in_pool(cheader.decompressor(), memoryview(objbytes)[offset:])
+            objbytes = await self._decompress(objbytes, key.data['fObjlen'])
 
-        obj.read(objbytes)
+        obj = cls()
+        try:
+            obj.read(objbytes, 0, ObjectContext(key.data['fKeylen'], self._streamers))
+        except RuntimeError:
+            # hand-coded readers reject versions they do not know, the streamer info may have it
+            if isinstance(obj, StreamedObject) or classname not in await self.streamers():
+                raise
+            obj = self._streamers.classfor(classname)()
+            obj.read(objbytes, 0, ObjectContext(key.data['fKeylen'], self._streamers))
+        obj.file = self
+        if isinstance(obj, TDirectoryFile):
+            keysbytes = await self._file.read(obj.data['fSeekKeys'], obj.data['fNbytesKeys'])
+            obj.keyslist.read(keysbytes)
         key.data['object'] = obj
         return obj
+
+    async def streamers(self):
+        '''The StreamerSet of this file, read from its TStreamerInfo record on first use'''
+        if self._streamers is None:
+            if self._streamersread is None:
+                self._streamersread = asyncio.ensure_future(self._read_streamers())
+            self._streamers = await asyncio.shield(self._streamersread)
+        return self._streamers
+
+    async def _read_streamers(self):
+        keybytes = await self._file.read(self.fileheader.data['fSeekInfo'], self.fileheader.data['fNbytesInfo'])
+        key = TKey()
+        offset = key.read(keybytes)
+        objbytes = memoryview(keybytes)[offset:]
+        if key.compressed:
+            objbytes = await self._decompress(objbytes, key.data['fObjlen'])
+        infos = TList()
+        infos.read(objbytes, 0, ObjectContext(key.data['fKeylen']))
+        return StreamerSet(info for info in infos if isinstance(info, TStreamerInfo))
+
+    async def get_many(self, keynames, gap=64 * 1024, max_readsize=16 * 1024 * 1024):
+        '''Read the objects for several keys, returned in the order of keynames
+
+        Keys are sorted by position in the file and neighbours closer than gap
+        are merged, up to max_readsize, into one read.  Each object is then a
+        zero-copy slice of its read and all are decompressed concurrently.
+        '''
+        with deadline(self._timeout):
+            return await self._get_many(keynames, gap, max_readsize)
+
+    async def _get_many(self, keynames, gap, max_readsize):
+        keys = [keyslist[name] for keyslist, name in await asyncio.gather(*(self._locate(name) for name in keynames))]
+        groups = []
+        for index in sorted(range(len(keys)), key=lambda i: keys[i].data['fSeekKey']):
+            key = keys[index]
+            start = key.data['fSeekKey'] + key.data['fKeylen']
+            stop = key.data['fSeekKey'] + key.data['fNbytes']
+            if groups and start <= groups[-1][1] + gap and stop - groups[-1][0] <= max_readsize:
+                groups[-1][1] = max(groups[-1][1], stop)
+                groups[-1][2].append((index, start, stop))
+            else:
+                groups.append([start, stop, [(index, start, stop)]])
+
+        async def fetch(group):
+            groupstart, groupstop, members = group
+            nbytes = groupstop - groupstart + sum(keys[index].data['fObjlen'] for index, _, _ in members if keys[index].compressed)
+            async with self._buffer(nbytes):
+                data = memoryview(await self._file.read(groupstart, groupstop - groupstart))
+                objs = await asyncio.gather(*(
+                    self._read_object(keys[index], data[start - groupstart:stop - groupstart])
+                    for index, start, stop in members
+                ))
+            return [(index, obj) for (index, _, _), obj in zip(members, objs)]
+
+        out = [None] * len(keys)
+        for results in await asyncio.gather(*(fetch(group) for group in groups)):
+            for index, obj in results:
+                out[index] = obj
+        return out
+
+    async def _decompress(self, payload, uncompressed_size):
+        '''Decompress into a bytearray of uncompressed_size, running the blocks in parallel in the pool'''
+        blocks = CompressionHeader.blocks(payload, uncompressed_size)
+        if len(blocks) == 1:
+            return await self._run_in_pool(Compression.decompress, payload, uncompressed_size)
+        out = bytearray(uncompressed_size)
+        view = memoryview(out)
+        await asyncio.gather(*(
+            self._run_in_pool(cheader.decompress_into, block, view[start:start + cheader.data['uncompressed_size']])
+            for cheader, block, start in blocks
+        ))
+        return out
+
+    @staticmethod
+    def _fill_basket(basket, payload, dtype, shape, source, destination, out):
+        count = basket.border // dtype.itemsize
+        data = numpy.frombuffer(payload, dtype=dtype, count=count).reshape((-1,) + shape)
+        out[destination] = data[source]
+
+    async def _read_basket_into(self, branch, index, dtype, shape, entry_start, entry_stop, out):
+        first, last = branch.basket_entry[index:index + 2]
+        # the uncompressed size is only in the basket header, estimate it from the entries
+        nbytes = int(branch.basket_bytes[index]) + int(last - first) * dtype.itemsize * int(numpy.prod(shape))
+        async with self._buffer(nbytes, BULK):
+            basketbytes = await self._file.read(int(branch.basket_seek[index]), int(branch.basket_bytes[index]))
+            basket = TBasket()
+            offset = basket.read(basketbytes)
+            lo, hi = max(entry_start, first), min(entry_stop, last)
+            source = slice(lo - first, hi - first)
+            destination = slice(lo - entry_start, hi - entry_start)
+            payload = memoryview(basketbytes)[offset:]
+            if basket.compressed:
+                payload = await self._decompress(payload, basket.data['fObjlen'])
+            await self._run_in_pool(self._fill_basket, basket, payload, dtype, shape, source, destination, out)
+
+    async def read_array(self, tree, branchname, entry_start=None, entry_stop=None):
+        '''Read entries [entry_start, entry_stop) of a fixed-size numeric branch into a numpy array
+
+        All needed baskets are fetched concurrently, and each is decompressed in
+        the threadpool straight into its slice of the preallocated output.
+        The reads are bulk priority for the scheduler.
+        '''
+        with deadline(self._timeout):
+            return await self._read_array(tree, branchname, entry_start, entry_stop)
+
+    async def _read_array(self, tree, branchname, entry_start, entry_stop):
+        branch = tree.branches[branchname]
+        if len(branch.leaves) != 1:
+            raise NotImplementedError("Branches with %d leaves are not supported" % len(branch.leaves))
+        leaf = branch.leaves[0]
+        if leaf.dtype is None:
+            raise NotImplementedError("Leaf type %s of branch %r is not supported" % (type(leaf).__name__, branchname))
+        if leaf.leafdata['fLeafCount'] is not None:
+            raise NotImplementedError("Variable-size branch %r is not supported" % branchname)
+        dtype = leaf.dtype
+        shape = (leaf.leafdata['fLen'],) if leaf.leafdata['fLen'] > 1 else ()
+
+        nentries = tree.data['fEntries']
+        entry_start = 0 if entry_start is None else min(max(entry_start, 0), nentries)
+        entry_stop = nentries if entry_stop is None else min(max(entry_stop, entry_start), nentries)
+        if entry_stop > entry_start and branch.basket_entry[-1] < entry_stop:
+            # the remaining entries are in baskets kept in memory with the tree (fBaskets)
+            raise NotImplementedError(
+                "Entries %d to %d of branch %r are in baskets stored in the TTree, which are not supported"
+                % (branch.basket_entry[-1], entry_stop, branchname)
+            )
+        out = numpy.empty((entry_stop - entry_start,) + shape, dtype=dtype.newbyteorder('='))
+
+        entries = branch.basket_entry
+        first = max(numpy.searchsorted(entries, entry_start, side='right') - 1, 0)
+        last = numpy.searchsorted(entries, entry_stop, side='left')
+        with bulk_reads():
+            await asyncio.gather(*(
+                self._read_basket_into(branch, index, dtype, shape, entry_start, entry_stop, out)
+                for index in range(first, min(last, len(branch.basket_seek)))
+            ))
+        return out
+
+    async def iterate(self, tree, branchnames, step=None, prefetch=2, max_bytes=None):
+        '''Yield {branchname: array} for consecutive chunks of tree
+
+        Chunk boundaries are cluster boundaries (see TTree.clusters), with
+        clusters merged until a chunk holds at least step entries.  While the
+        caller processes one chunk, up to prefetch following chunks are fetched
+        and decompressed in the background, as long as their estimated size
+        stays within max_bytes.  The chunk to be yielded next is fetched even if
+        it alone is larger than max_bytes.
+        '''
+        branches = tree.branches
+        rowbytes = 0
+        for name in branchnames:
+            leaf = branches[name].leaves[0]
+            if leaf.dtype is not None:
+                rowbytes += leaf.dtype.itemsize * max(leaf.leafdata['fLen'], 1)
+
+        clusters = tree.clusters(branchnames)
+        chunks = []
+        start = clusters[0]
+        for stop in clusters[1:]:
+            if step is None or stop - start >= step or stop == clusters[-1]:
+                chunks.append((int(start), int(stop)))
+                start = stop
+
+        async def fetch(start, stop):
+            arrays = await asyncio.gather(*(self.read_array(tree, name, start, stop) for name in branchnames))
+            return dict(zip(branchnames, arrays))
+
+        pending = []
+        chunks = collections.deque(chunks)
+        try:
+            while True:
+                inflight = sum((stop - start) * rowbytes for _, start, stop in pending)
+                while chunks and len(pending) <= prefetch:
+                    start, stop = chunks[0]
+                    nbytes = (stop - start) * rowbytes
+                    if pending and max_bytes is not None and inflight + nbytes > max_bytes:
+                        break
+                    chunks.popleft()
+                    pending.append((asyncio.ensure_future(fetch(start, stop)), start, stop))
+                    inflight += nbytes
+                if not pending:
+                    return
+                task, _, _ = pending.pop(0)
+                yield await task
+        finally:
+            for task, _, _ in pending:
+                task.cancel()
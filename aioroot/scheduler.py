@@ -0,0 +1,159 @@
+import heapq
+import asyncio
+import weakref
+import itertools
+import contextvars
+from contextlib import contextmanager
+
+META = 0
+BULK = 1
+
+# priority of the reads made in the current context, see bulk_reads()
+io_priority = contextvars.ContextVar('aioroot_io_priority', default=META)
+
+
+@contextmanager
+def bulk_reads():
+    '''Mark the reads made inside the block, and in tasks started from it, as bulk payload'''
+    token = io_priority.set(BULK)
+    try:
+        yield
+    finally:
+        io_priority.reset(token)
+
+
+class _Budget:
+    '''A count and a byte total with limits, granted to waiters in (priority, arrival) order
+
+    A single grant larger than maxbytes is let through when nothing else is held,
+    so that it cannot wait forever.
+    '''
+    def __init__(self, maxcount, maxbytes):
+        self.maxcount = maxcount
+        self.maxbytes = maxbytes
+        self.count = 0
+        self.nbytes = 0
+        self.peak_bytes = 0
+        self.waits = 0
+        self._waiters = []
+        self._arrival = itertools.count()
+
+    def _fits(self, nbytes):
+        if self.maxcount is not None and self.count >= self.maxcount:
+            return False
+        return self.count == 0 or self.maxbytes is None or self.nbytes + nbytes <= self.maxbytes
+
+    def _take(self, nbytes):
+        self.count += 1
+        self.nbytes += nbytes
+        self.peak_bytes = max(self.peak_bytes, self.nbytes)
+
+    async def acquire(self, nbytes, priority):
+        if not self._waiters and self._fits(nbytes):
+            self._take(nbytes)
+            return
+        self.waits += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._arrival), nbytes, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # granted just as we were cancelled
+                self.release(nbytes)
+            else:
+                self._wake()
+            raise
+
+    def release(self, nbytes):
+        self.count -= 1
+        self.nbytes -= nbytes
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            priority, _, nbytes, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._fits(nbytes):
+                return
+            heapq.heappop(self._waiters)
+            self._take(nbytes)
+            future.set_result(None)
+
+
+class _Grant:
+    def __init__(self, scheduler, kind, nbytes, priority):
+        self._scheduler = scheduler
+        self._kind = kind
+        self._budget = None
+        self._nbytes = nbytes
+        self._priority = priority
+
+    async def __aenter__(self):
+        # resolved here, in the loop that will wait and release
+        self._budget = self._scheduler._budgets()[self._kind]
+        await self._budget.acquire(self._nbytes, self._priority)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._budget.release(self._nbytes)
+
+
+class IOScheduler:
+    '''Limits shared by all files on requests in flight and bytes buffered
+
+    Byte sources hold a request grant (counted against max_requests and
+    max_inflight_bytes) while a request is outstanding, and ROOTFile holds a
+    buffer grant (against max_buffered_bytes) from reading an object or basket
+    until it is decompressed and unpacked.  The two are separate so that a
+    buffer grant never waits on another buffer grant's request.  Callers over
+    the limits wait, metadata (META) ahead of bulk payload (BULK), then first
+    come first served.  A limit of None is unlimited.
+
+    Waiters are futures of one event loop, so each loop using the scheduler
+    gets its own budgets with these limits, and stats sums over the loops.
+    '''
+    def __init__(self, max_requests=256, max_inflight_bytes=256 * 1024 * 1024, max_buffered_bytes=1024 * 1024 * 1024):
+        self.max_requests = max_requests
+        self.max_inflight_bytes = max_inflight_bytes
+        self.max_buffered_bytes = max_buffered_bytes
+        # loop: (inflight, buffered)
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _budgets(self):
+        loop = asyncio.get_running_loop()
+        budgets = self._loops.get(loop)
+        if budgets is None:
+            budgets = self._loops[loop] = (
+                _Budget(self.max_requests, self.max_inflight_bytes),
+                _Budget(None, self.max_buffered_bytes),
+            )
+        return budgets
+
+    def request(self, nbytes, priority=None):
+        '''Async context manager holding one request of nbytes in flight'''
+        return _Grant(self, 0, nbytes, io_priority.get() if priority is None else priority)
+
+    def buffer(self, nbytes, priority=None):
+        '''Async context manager holding nbytes of buffers'''
+        return _Grant(self, 1, nbytes, io_priority.get() if priority is None else priority)
+
+    def stats(self):
+        budgets = list(self._loops.values())
+        inflight = [b for b, _ in budgets]
+        buffered = [b for _, b in budgets]
+        return {
+            'requests': sum(b.count for b in inflight),
+            'inflight_bytes': sum(b.nbytes for b in inflight),
+            'peak_inflight_bytes': max((b.peak_bytes for b in inflight), default=0),
+            'request_waits': sum(b.waits for b in inflight),
+            'buffers': sum(b.count for b in buffered),
+            'buffered_bytes': sum(b.nbytes for b in buffered),
+            'peak_buffered_bytes': max((b.peak_bytes for b in buffered), default=0),
+            'buffer_waits': sum(b.waits for b in buffered),
+        }
+
+
+shared_scheduler = IOScheduler()
@@ -0,0 +1,117 @@
+import os
+import queue
+import pickle
+import asyncio
+import multiprocessing
+from collections import Counter
+from .bulk import fetch
+
+
+def entries(tree):
+    '''Transform of scan giving the number of entries of a tree'''
+    return tree.data['fEntries']
+
+
+def _pickled(url, result):
+    '''result pickled, or if it cannot be, a pickled RuntimeError saying why
+
+    Pickled here, one result at a time, as an unpicklable object in a batch
+    put on the queue would be dropped with the whole batch by its feeder thread.
+    '''
+    try:
+        return pickle.dumps(result)
+    except Exception as exc:
+        if isinstance(result, BaseException):
+            return pickle.dumps(RuntimeError(repr(result)))
+        return pickle.dumps(RuntimeError("Result for %s could not be sent from the scan worker: %r" % (url, exc)))
+
+
+async def _scan_shard(results, worker, urls, keyname, transform, batchsize, options):
+    batch = []
+    async for url, result in fetch(urls, keyname, transform=transform, **options):
+        batch.append((url, _pickled(url, result)))
+        if len(batch) >= batchsize:
+            results.put((worker, batch))
+            batch = []
+    if batch:
+        results.put((worker, batch))
+
+
+def _worker(results, worker, urls, keyname, transform, batchsize, options):
+    try:
+        asyncio.run(_scan_shard(results, worker, urls, keyname, transform, batchsize, options))
+    finally:
+        # None marks the end of this worker's results
+        results.put((worker, None))
+
+
+def scan(urls, keyname, transform, processes=None, batchsize=64, **options):
+    '''Read keyname from each of urls in worker processes, yielding (url, result) as they arrive
+
+    The urls are dealt round robin to processes workers (one per core by
+    default).  Each runs its own event loop and threadpool over its share with
+    aioroot.fetch, so that unpacking and decompression use every core, and
+    sends results back in batches of up to batchsize.  Only the result of
+    transform, which should keep just what is needed (e.g. aioroot.sharded.entries),
+    crosses the process boundary: the objects themselves refer to their open
+    file and cannot be sent.  transform and the extra keyword arguments (passed
+    on to fetch and ROOTFile) must be picklable.  As with fetch, a file that
+    fails, or whose result cannot be pickled, yields an exception in place of
+    the result.
+    '''
+    urls = list(urls)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(min(processes, len(urls)), 1)
+    # spawn, as forking a process with running threads (threadpools, aioroot.sync) is unsafe
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = {}
+    for worker in range(processes):
+        shard = urls[worker::processes]
+        process = context.Process(
+            target=_worker,
+            args=(results, worker, shard, keyname, transform, batchsize, options),
+            name='aioroot-scan-%d' % worker,
+            daemon=True,
+        )
+        process.start()
+        workers[worker] = (process, Counter(shard))
+
+    try:
+        while workers:
+            try:
+                worker, batch = results.get(timeout=1)
+            except queue.Empty:
+                for worker, (process, remaining) in list(workers.items()):
+                    if not process.is_alive() and results.empty():
+                        # died without reporting, e.g. killed for memory
+                        del workers[worker]
+                        error = RuntimeError("Scan worker exited with code %r" % process.exitcode)
+                        for url in remaining.elements():
+                            yield url, error
+                continue
+            if batch is None:
+                process, remaining = workers.pop(worker)
+                process.join()
+                for url in remaining.elements():
+                    yield url, RuntimeError("Scan worker stopped before reading this file")
+                continue
+            remaining = workers[worker][1]
+            for url, result in batch:
+                remaining[url] -= 1
+                try:
+                    result = pickle.loads(result)
+                except Exception as exc:
+                    # e.g. an exception class whose constructor needs other arguments
+                    result = RuntimeError("Result for %s could not be unpickled: %r" % (url, exc))
+                yield url, result
+    finally:
+        for process, _ in workers.values():
+            process.terminate()
+            process.join()
+
+
+def numentries(urls, treename, **kwargs):
+    '''Yield (url, number of entries in treename) from worker processes, see scan'''
+    return scan(urls, treename, entries, **kwargs)
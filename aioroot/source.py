@@ -0,0 +1,110 @@
+import os
+import mmap
+from urllib.parse import urlparse
+from .trace import Stats
+
+
+class ByteSource:
+    '''Asynchronous random-access byte source
+
+    Subclasses implement open, read, stat, and close as coroutines.
+    read(offset, size) returns a bytes-like object, which may be shorter
+    than requested if the source ends before offset + size.
+    stats aggregates the trace spans of this file.
+    '''
+    def __init__(self, url):
+        self._url = url
+        self.stats = Stats()
+
+    @property
+    def url(self):
+        return self._url
+
+    async def open(self):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+    async def stat(self):
+        raise NotImplementedError
+
+    async def read(self, offset, size):
+        raise NotImplementedError
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # could pass lost connection exception for example
+        return await self.close()
+
+
+class LocalFile(ByteSource):
+    '''Local file source backed by an mmap
+
+    Reads are served as zero-copy memoryview slices of the mapping, so
+    no I/O request is issued and no bytes are copied until a consumer
+    needs to.
+    '''
+    def __init__(self, url):
+        super().__init__(url)
+        self._path = urlparse(url).path if url.startswith('file:') else url
+        self._fd = None
+        self._mmap = None
+        self._view = None
+
+    async def open(self):
+        self._fd = os.open(self._path, os.O_RDONLY)
+        size = os.fstat(self._fd).st_size
+        if size > 0:
+            self._mmap = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+        else:
+            self._view = memoryview(b'')
+        return self
+
+    async def close(self):
+        if self._fd is None:
+            return
+        self._view.release()
+        self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # slices still referenced by the caller, mapping goes away with them
+                pass
+            self._mmap = None
+        os.close(self._fd)
+        self._fd = None
+
+    async def stat(self):
+        st = os.fstat(self._fd)
+        return {'size': st.st_size, 'modtime': int(st.st_mtime), 'flags': 0, 'id': '%d:%d' % (st.st_dev, st.st_ino)}
+
+    async def read(self, offset, size):
+        if self._view is None:
+            raise IOError("File %s is not open" % self._url)
+        return self._view[offset:offset + size]
+
+
+def _xrootd_source(url):
+    from .xrootd import XRootDFile
+    return XRootDFile(url)
+
+
+SourceMap = {
+    '': LocalFile,
+    'file': LocalFile,
+    'root': _xrootd_source,
+    'xroot': _xrootd_source,
+}
+
+
+def source_for(url):
+    '''Pick a ByteSource implementation based on the url scheme'''
+    scheme = urlparse(url).scheme
+    if scheme not in SourceMap:
+        raise ValueError("No byte source registered for scheme %r in %s" % (scheme, url))
+    return SourceMap[scheme](url)
@@ -0,0 +1,294 @@
+import struct
+import numpy
+from collections.abc import Mapping
+from .structure import (
+    NamedStruct,
+    TStreamed,
+    TObject,
+    TNamed,
+    TString,
+    TStreamerBase,
+    TStreamerBasicType,
+    TStreamerBasicPointer,
+    TStreamerString,
+    TStreamerObject,
+    TStreamerObjectAny,
+    TStreamerObjectPointer,
+    TStreamerObjectAnyPointer,
+    TStreamerSTL,
+    TStreamerSTLstring,
+    ClassMap,
+    readarray,
+    read_object_any,
+)
+
+# TStreamerElement fType codes, from TVirtualStreamerInfo
+kOffsetL = 20
+kOffsetP = 40
+kCounter = 6
+kDouble32 = 9
+kObject = 61
+kTObject = 66
+kTNamed = 67
+kSTLvector = 1
+kSTLstring = 365
+
+# struct codes of the basic types, Double32 without a range is written as a float
+_basiccodes = {
+    1: 'b', 2: 'h', 3: 'i', 4: 'q', 5: 'f', 6: 'i', 8: 'd', 9: 'f', 11: 'B',
+    12: 'H', 13: 'I', 14: 'Q', 15: 'I', 16: 'q', 17: 'Q', 18: '?',
+}
+
+# generated unpackers by (class name, class version, checksum), shared by all files
+_unpackers = {}
+_classes = {}
+
+
+class StreamedObject(TStreamed):
+    '''An object of a class not in ClassMap, read by the unpacker generated from its TStreamerInfo
+
+    Members are in data by name, and base classes by class name as elsewhere.
+    Reading needs context.streamers to find the unpacker for the version read.
+    '''
+    classname = None
+    checkSum = NamedStruct(">I", 'fCheckSum')
+
+    def read(self, buffer, offset=0, context=None):
+        offset = super().read(buffer, offset)
+        checksum = None
+        if self.data['fVersion'] == 0:
+            # classes without a ClassDef are identified by the streamer checksum instead
+            checksum, offset = StreamedObject.checkSum.unpack_from(buffer, offset)
+        unpack = context.streamers.unpacker(self.classname, self.data['fVersion'], checksum)
+        offset = unpack(buffer, offset, self.data, context, self._end)
+        self.check(offset)
+        return offset
+
+
+def streamedclass(classname):
+    '''The StreamedObject subclass for classname, one per class name in the process'''
+    if classname not in _classes:
+        _classes[classname] = type(classname.decode(), (StreamedObject,), {'classname': classname})
+    return _classes[classname]
+
+
+class StreamerSet(Mapping):
+    '''The TStreamerInfo records of a file, by class name then class version'''
+    def __init__(self, infos):
+        self._infos = {}
+        for info in infos:
+            self._infos.setdefault(info.name, {})[info.data['fClassVersion']] = info
+
+    def __getitem__(self, classname):
+        return self._infos[classname]
+
+    def __iter__(self):
+        return iter(self._infos)
+
+    def __len__(self):
+        return len(self._infos)
+
+    def classfor(self, classname):
+        '''The class to read classname with, or None if the file has no streamer for it'''
+        return streamedclass(classname) if classname in self._infos else None
+
+    def unpacker(self, classname, version, checksum=None):
+        versions = self._infos.get(classname, {})
+        if checksum is not None:
+            info = next((info for info in versions.values() if info.data['fCheckSum'] == checksum), None)
+        else:
+            info = versions.get(version)
+        if info is None:
+            raise RuntimeError("No streamer for class %r version %d" % (classname, version))
+        key = (classname, info.data['fClassVersion'], info.data['fCheckSum'])
+        if key not in _unpackers:
+            _unpackers[key] = generate(info)
+        return _unpackers[key]
+
+
+def _readmember(classname, buffer, offset, context):
+    '''Read an embedded object or base class, hand-coded if possible'''
+    cls = ClassMap.get(classname)
+    if cls is not None:
+        try:
+            obj = cls()
+            return obj, obj.read(buffer, offset, context)
+        except RuntimeError:
+            # e.g. a class version the hand-coded reader does not know
+            if context.streamers is None or classname not in context.streamers:
+                raise
+    obj = streamedclass(classname)()
+    return obj, obj.read(buffer, offset, context)
+
+
+def _fixedstep(run):
+    '''Fuse a run of fixed-size members, given as (name, code, array length or 0), into one struct'''
+    unpacker = struct.Struct('>' + ''.join(code if count == 0 else '%d%s' % (count, code) for _, code, count in run))
+    size = unpacker.size
+    if all(count == 0 for _, _, count in run):
+        names = [name for name, _, _ in run]
+
+        def step(buffer, offset, data, context, end):
+            data.update(zip(names, unpacker.unpack_from(buffer, offset)))
+            return offset + size
+        return step
+
+    layout = []
+    index = 0
+    for name, _, count in run:
+        layout.append((name, index, count))
+        index += max(count, 1)
+
+    def step(buffer, offset, data, context, end):
+        values = unpacker.unpack_from(buffer, offset)
+        for name, index, count in layout:
+            data[name] = values[index] if count == 0 else numpy.array(values[index:index + count])
+        return offset + size
+    return step
+
+
+def _fixedmember(element, name):
+    '''The (name, code, count) of a fixed-size member, or None'''
+    if type(element) is not TStreamerBasicType:
+        return None
+    ftype = element.elementdata['fType']
+    count = 0
+    if kOffsetL < ftype < kOffsetP:
+        ftype -= kOffsetL
+        count = element.elementdata['fArrayLength']
+    if ftype == kDouble32 and b'[' in element.title:
+        # packed with a range, not supported
+        return None
+    code = _basiccodes.get(ftype)
+    if code is None:
+        return None
+    return name, code, count
+
+
+def _skiprest(buffer, offset, data, context, end):
+    return end
+
+
+def _tobjectstep(name):
+    def step(buffer, offset, data, context, end):
+        fields, offset = TObject.header1.unpack_from(buffer, offset)
+        if fields['fBits'] & TObject.kIsReferenced:
+            offset += 2  # process id
+        data[name] = fields
+        return offset
+    return step
+
+
+def _objectstep(name, classname):
+    def step(buffer, offset, data, context, end):
+        data[name], offset = _readmember(classname, buffer, offset, context)
+        return offset
+    return step
+
+
+def _tnamedstep(name):
+    def step(buffer, offset, data, context, end):
+        data[name] = TNamed()
+        return data[name].read(buffer, offset)
+    return step
+
+
+def _pointerstep(name):
+    def step(buffer, offset, data, context, end):
+        data[name], offset = read_object_any(buffer, offset, context)
+        return offset
+    return step
+
+
+def _stringstep(name):
+    def step(buffer, offset, data, context, end):
+        data[name], offset = TString.readstring(buffer, offset)
+        return offset
+    return step
+
+
+def _basicpointerstep(name, code, countname):
+    dtype = numpy.dtype('>' + code)
+
+    def step(buffer, offset, data, context, end):
+        data[name], offset = readarray(buffer, offset, dtype, data[countname])
+        return offset
+    return step
+
+
+def _stlstep(name, element):
+    nitems = struct.Struct('>i')
+    stltype, ctype = element.data['fSTLtype'], element.data['fCtype']
+    code = _basiccodes.get(ctype)
+    isstring = type(element) is TStreamerSTLstring or stltype == kSTLstring
+
+    def step(buffer, offset, data, context, end):
+        header = TStreamed()
+        offset = header.read(buffer, offset)
+        if isstring:
+            data[name], offset = TString.readstring(buffer, offset)
+        elif stltype == kSTLvector and code is not None:
+            count, = nitems.unpack_from(buffer, offset)
+            dtype = numpy.dtype('>' + code)
+            data[name] = numpy.frombuffer(buffer, dtype=dtype, count=count, offset=offset + 4).astype(dtype.newbyteorder('='))
+        # anything else (containers of objects, maps, ...) is skipped
+        return header._end
+    return step
+
+
+def _step(element, name):
+    '''The unpack step for a member that is not fixed-size, _skiprest if not supported'''
+    ftype = element.elementdata['fType']
+    if type(element) is TStreamerBase:
+        if element.name == b'TObject':
+            return _tobjectstep(name)
+        return _objectstep(name, element.name)
+    if type(element) in (TStreamerObject, TStreamerObjectAny):
+        if ftype == kTObject:
+            return _tobjectstep(name)
+        if ftype == kTNamed:
+            return _tnamedstep(name)
+        return _objectstep(name, element.elementdata['fTypeName'])
+    if type(element) in (TStreamerObjectPointer, TStreamerObjectAnyPointer):
+        return _pointerstep(name)
+    if type(element) is TStreamerString:
+        return _stringstep(name)
+    if type(element) is TStreamerBasicPointer and (ftype - kOffsetP) in _basiccodes and ftype - kOffsetP != kDouble32:
+        return _basicpointerstep(name, _basiccodes[ftype - kOffsetP], element.data['fCountName'].decode())
+    if isinstance(element, TStreamerSTL):
+        return _stlstep(name, element)
+    return _skiprest
+
+
+def generate(info):
+    '''Build the unpack function for the class version described by a TStreamerInfo
+
+    unpack(buffer, offset, data, context, end) fills data with the members and
+    returns the new offset.  Consecutive fixed-size members are read with one
+    precompiled struct.  At the first member that cannot be read, the rest of
+    the object (up to end, from its byte count) is skipped.
+    '''
+    steps = []
+    run = []
+    for element in info.elements:
+        name = element.name.decode()
+        fixed = _fixedmember(element, name)
+        if fixed is not None:
+            run.append(fixed)
+            continue
+        if run:
+            steps.append(_fixedstep(run))
+            run = []
+        step = _step(element, name)
+        steps.append(step)
+        if step is _skiprest:
+            break
+    if run:
+        steps.append(_fixedstep(run))
+
+    def unpack(buffer, offset, data, context, end):
+        for step in steps:
+            offset = step(buffer, offset, data, context, end)
+        return offset
+
+    return unpack
@@ -1,6 +1,6 @@
 import struct
-from functools import partial
-from collections.abc import Mapping
+import numpy
+from collections.abc import Mapping, Sequence
 
 
 class NamedStruct:
@@ -35,6 +35,29 @@ class ROOTObject:
         return "<%s instance at 0x%x with data: %r>" % (type(self).__name__, id(self), self.data)
 
 
+class ObjectContext:
+    '''Classes and objects already read from one key payload
+
+    ROOT refers back to them by their position in the buffer counted from
+    the start of the key, so the origin is the key length.
+    '''
+    def __init__(self, origin=0, streamers=None):
+        self.origin = origin
+        self.refs = {}
+        # StreamerSet of the file, if read, for classes not in ClassMap
+        self.streamers = streamers
+
+
+def readarray(buffer, offset, dtype, count):
+    '''Read a fast array preceded by its one-byte presence flag into a native-endian numpy array'''
+    present, offset = buffer[offset], offset + 1
+    dtype = numpy.dtype(dtype)
+    if not present:
+        return numpy.zeros(count, dtype=dtype.newbyteorder('=')), offset
+    array = numpy.frombuffer(buffer, dtype=dtype, count=count, offset=offset).astype(dtype.newbyteorder('='))
+    return array, offset + count * dtype.itemsize
+
+
 class TStreamed(ROOTObject):
     header1 = NamedStruct(">IH", ['fSize', 'fVersion'])
 
@@ -136,10 +159,14 @@ class TKey(ROOTObject):
         self.data['fClassName'], offset = TString.readstring(buffer, offset)
         self.data['fName'], offset = TString.readstring(buffer, offset)
         self.data['fTitle'], offset = TString.readstring(buffer, offset)
-        if start + self.data['fKeylen'] != offset:
-            raise RuntimeError("Read fewer bytes from TKey (%d) than expected (%d)" % (offset - start, self.data['fKeylen']))
+        if type(self) is TKey:
+            self.check(start, offset)
         return offset
 
+    def check(self, start, offset):
+        if start + self.data['fKeylen'] != offset:
+            raise RuntimeError("Read fewer bytes from %s (%d) than expected (%d)" % (type(self).__name__, offset - start, self.data['fKeylen']))
+
     @property
     def size(self):
         return self.data['fKeylen']
@@ -153,45 +180,149 @@ class TKey(ROOTObject):
         return b'%s;%d' % (self.data['fName'], self.data['fCycle'])
 
 
+class TBasket(TKey):
+    header3 = NamedStruct(">HiiiiB", ['fBasketVersion', 'fBufferSize', 'fNevBufSize', 'fNevBuf', 'fLast', 'flag'])
+
+    def read(self, buffer, offset=0):
+        start = offset
+        offset = super().read(buffer, offset)
+        fields, offset = TBasket.header3.unpack_from(buffer, offset)
+        self.data.update(fields)
+        self.check(start, offset)
+        return offset
+
+    @property
+    def border(self):
+        '''Size of the entry data in the uncompressed payload, entry offsets follow it'''
+        return self.data['fLast'] - self.data['fKeylen']
+
+
 class TKeyList(ROOTObject, Mapping):
+    '''Keys of a directory, held as a table
+
+    One pass over the buffer finds where each key starts and its name, then
+    the fixed-size TKey fields are gathered into numpy columns.  TKey objects
+    are only built, from the retained buffer, when a key is accessed.
+    '''
     nKeys = NamedStruct(">i", 'nKeys')
+    # fVersion and fKeylen, which is all that is needed to step to the strings and the next key
+    keystep = struct.Struct(">4xh8xh")
+    columns = [
+        ('fNbytes', '>i4', 0),
+        ('fVersion', '>i2', 4),
+        ('fObjlen', '>i4', 6),
+        ('fDatime', '>u4', 10),
+        ('fKeylen', '>i2', 14),
+        ('fCycle', '>i2', 16),
+    ]
 
     def __init__(self):
         super().__init__()
         self.headkey = TKey()
         self.data['headkey'] = self.headkey
+        self.columns = {}
+        self.data['columns'] = self.columns
+        self.names = []
+        self.classnames = []
+        self._buffer = b''
+        self._starts = numpy.zeros(0, dtype=numpy.int64)
         self._keys = {}
-        self.data['keys'] = self._keys
         self._lastcycle = {}
+        self._othercycles = {}
+
+    @staticmethod
+    def _gather(bytearr, starts, dtype):
+        dtype = numpy.dtype(dtype)
+        index = starts[:, None] + numpy.arange(dtype.itemsize)
+        return bytearr[index].view(dtype)[:, 0].astype(dtype.newbyteorder('='))
 
     def read(self, buffer, offset=0):
         offset = self.headkey.read(buffer, offset)
         end = offset + self.headkey.data['fObjlen']
         nkeys, offset = TKeyList.nKeys.unpack_from(buffer, offset)
         self.data['nKeys'] = nkeys
-        while offset < end and len(self._keys) < nkeys:
-            key = TKey()
-            offset = key.read(buffer, offset)
-            self._keys[key.namecycle] = key
-            if self._lastcycle.get(key.data['fName'], -1) < key.data['fCycle']:
-                self._lastcycle[key.data['fName']] = key.data['fCycle']
-        if len(self._keys) != nkeys:
-            raise RuntimeError("Expected to read %d keys but got %d in %r" % (nkeys, len(self._keys), self))
+        begin = offset
+        starts = []
+        classnames = {}
+        readstring = TString.readstring
+        while offset < end and len(starts) < nkeys:
+            version, keylen = TKeyList.keystep.unpack_from(buffer, offset)
+            starts.append(offset - begin)
+            classname, strpos = readstring(buffer, offset + (34 if version > 1000 else 26))
+            self.classnames.append(classnames.setdefault(classname, classname))
+            self.names.append(readstring(buffer, strpos)[0])
+            offset += keylen
+        if len(starts) != nkeys:
+            raise RuntimeError("Expected to read %d keys but got %d in %r" % (nkeys, len(starts), self))
+
+        # copied, a view would keep the whole read (tail window, vector read, mmap) alive with the file
+        self._buffer = bytes(buffer[begin:offset])
+        self._starts = numpy.array(starts, dtype=numpy.int64)
+        bytearr = numpy.frombuffer(self._buffer, dtype=numpy.uint8)
+        for name, dtype, position in TKeyList.columns:
+            self.columns[name] = self._gather(bytearr, self._starts + position, dtype)
+        big = self.columns['fVersion'] > 1000
+        for name, position in (('fSeekKey', 0), ('fSeekPdir', 1)):
+            small = self._gather(bytearr, self._starts + 18 + 4 * position, '>i4')
+            large = self._gather(bytearr, self._starts + 18 + 8 * position, '>i8') if big.any() else small
+            self.columns[name] = numpy.where(big, large, small).astype(numpy.int64)
+
+        for row, (name, cycle) in enumerate(zip(self.names, self.columns['fCycle'].tolist())):
+            last = self._lastcycle.get(name)
+            if last is None:
+                self._lastcycle[name] = row
+            elif self.columns['fCycle'][last] < cycle:
+                self._othercycles[(name, int(self.columns['fCycle'][last]))] = last
+                self._lastcycle[name] = row
+            else:
+                self._othercycles[(name, cycle)] = row
+
         if offset < end:
             self.data['trailings'] = bytes(buffer[offset:end])
             offset = end
         return offset
 
+    def namecycle(self, row):
+        return b'%s;%d' % (self.names[row], self.columns['fCycle'][row])
+
+    def row(self, keyname):
+        '''Row of the table for a name (latest cycle) or name;cycle'''
+        if keyname in self._lastcycle:
+            return self._lastcycle[keyname]
+        name, _, cycle = keyname.rpartition(b';')
+        row = self._lastcycle.get(name)
+        if row is not None and cycle.isdigit():
+            if self.columns['fCycle'][row] == int(cycle):
+                return row
+            row = self._othercycles.get((name, int(cycle)))
+            if row is not None:
+                return row
+        raise KeyError(keyname)
+
+    def key(self, row):
+        '''The TKey for a row, built on first access'''
+        key = self._keys.get(row)
+        if key is None:
+            key = TKey()
+            key.read(self._buffer, int(self._starts[row]))
+            self._keys[row] = key
+        return key
+
     def __iter__(self):
-        return iter(self._keys)
+        return (self.namecycle(row) for row in range(len(self.names)))
 
     def __len__(self):
-        return len(self._keys)
+        return len(self.names)
+
+    def __contains__(self, keyname):
+        try:
+            self.row(keyname)
+        except KeyError:
+            return False
+        return True
 
     def __getitem__(self, keyname):
-        if keyname not in self._keys:
-            keyname = b'%s;%d' % (keyname, self._lastcycle[keyname])
-        return self._keys.__getitem__(keyname)
+        return self.key(self.row(keyname))
 
 
 class TDirectory(ROOTObject):
@@ -201,6 +332,9 @@ class TDirectory(ROOTObject):
 
     def read(self, buffer, offset=0):
         offset = NameTitle.read(self, buffer, offset)
+        return self.readrecord(buffer, offset)
+
+    def readrecord(self, buffer, offset=0):
         fields, offset = TDirectory.header1.unpack_from(buffer, offset)
         self.data.update(fields)
         if self.data['fVersion'] < 1000:
@@ -215,18 +349,39 @@ class TDirectory(ROOTObject):
         return self.data[key]
 
 
+class TDirectoryFile(TDirectory):
+    '''A subdirectory, its key payload is the directory record without name and title
+
+    The keys list is filled in by ROOTFile, which has to read it from fSeekKeys.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.keyslist = TKeyList()
+
+    def read(self, buffer, offset=0, context=None):
+        return self.readrecord(buffer, offset)
+
+    def keys(self):
+        return self.keyslist.keys()
+
+
 class Compression:
     _, kZLIB, kLZMA, kOldCompressionAlgo, kLZ4, kZSTD = range(6)
     magicmap = {b'ZL': kZLIB, b'XZ': kLZMA, b'L4': kLZ4, b'ZS': kZSTD}
 
     @classmethod
-    def decompressor(cls, fCompress):
+    def algorithm(cls, fCompress):
         if isinstance(fCompress, bytes):
-            fCompress = cls.magicmap[fCompress]
+            return cls.magicmap[fCompress]
+        return fCompress
+
+    @classmethod
+    def decompressor(cls, fCompress):
+        fCompress = cls.algorithm(fCompress)
         if fCompress == cls.kZLIB:
             def decompress(bytes, uncompressed_size):
                 from zlib import decompress as zlib_decompress
-                return zlib_decompress(bytes)
+                return zlib_decompress(bytes, bufsize=uncompressed_size)
 
             return decompress
         elif fCompress == cls.kLZMA:
@@ -244,11 +399,55 @@ class Compression:
 
             return decompress
         elif fCompress == cls.kZSTD:
-            raise NotImplementedError("kZSTD")
+            def decompress(bytes, uncompressed_size):
+                from zstandard import ZstdDecompressor
+                return ZstdDecompressor().decompress(bytes, max_output_size=uncompressed_size)
+
+            return decompress
         raise RuntimeError("Compression not supported")
 
+    @classmethod
+    def decompressor_into(cls, fCompress):
+        '''Return decompress_into(bytes, out) writing into the writable buffer out, returning the size written
+
+        Uses cramjam if available to decompress in place, otherwise the output
+        of decompressor is copied into out.
+        '''
+        fCompress = cls.algorithm(fCompress)
+        try:
+            import cramjam
+        except ImportError:
+            cramjam = None
+        if cramjam is not None:
+            if fCompress == cls.kZLIB:
+                return cramjam.zlib.decompress_into
+            elif fCompress == cls.kLZMA:
+                return cramjam.xz.decompress_into
+            elif fCompress == cls.kLZ4:
+                return cramjam.lz4.decompress_block_into
+            elif fCompress == cls.kZSTD:
+                return cramjam.zstd.decompress_into
+        decompressor = cls.decompressor(fCompress)
+
+        def decompress_into(bytes, out):
+            result = decompressor(bytes, uncompressed_size=len(out))
+            out[:len(result)] = result
+            return len(result)
+
+        return decompress_into
+
+    @classmethod
+    def decompress(cls, buffer, uncompressed_size):
+        '''Decompress all blocks of a payload into one preallocated bytearray'''
+        out = bytearray(uncompressed_size)
+        view = memoryview(out)
+        for cheader, block, start in CompressionHeader.blocks(buffer, uncompressed_size):
+            cheader.decompress_into(block, view[start:start + cheader.data['uncompressed_size']])
+        return out
+
 
 class CompressionHeader(ROOTObject):
+    '''Header of one compressed block, ROOT splits large payloads into blocks of at most 16 MiB'''
     header = NamedStruct(">2sB3s3s", ['magic', 'version', 'compressed_size', 'uncompressed_size'])
     l4header = NamedStruct(">Q", 'checksum')
     l4dochecksum = True
@@ -263,31 +462,61 @@ class CompressionHeader(ROOTObject):
         fields['compressed_size'] = self.decode_size(fields['compressed_size'])
         fields['uncompressed_size'] = self.decode_size(fields['uncompressed_size'])
         self.data.update(fields)
-        if self.data['magic'] == 'L4':
+        self.data['block_size'] = self.data['compressed_size']
+        if self.data['magic'] == b'L4':
             self.data['checksum'], offset = CompressionHeader.l4header.unpack_from(buffer, offset)
+            self.data['block_size'] -= CompressionHeader.l4header.size
         return offset
 
+    @classmethod
+    def blocks(cls, buffer, uncompressed_size, offset=0):
+        '''Split a payload into (header, compressed block, output offset) for each block'''
+        view = memoryview(buffer)
+        blocks = []
+        outoffset = 0
+        while outoffset < uncompressed_size:
+            cheader = cls()
+            offset = cheader.read(view, offset)
+            size = cheader.data['block_size']
+            blocks.append((cheader, view[offset:offset + size], outoffset))
+            offset += size
+            outoffset += cheader.data['uncompressed_size']
+        if outoffset != uncompressed_size:
+            raise RuntimeError("Compressed blocks hold %d bytes, expected %d" % (outoffset, uncompressed_size))
+        return blocks
+
+    def verify(self, bytes):
+        if self.l4dochecksum and self.data['magic'] == b'L4':
+            import xxhash
+            if xxhash.xxh64(bytes).intdigest() != self.data['checksum']:
+                raise RuntimeError("Checksum mismatch while decompressing")
+
+    def decompress_into(self, bytes, out):
+        self.verify(bytes)
+        size = Compression.decompressor_into(self.data['magic'])(bytes, out)
+        if size != self.data['uncompressed_size']:
+            raise RuntimeError("Decompressed %d bytes, expected %d" % (size, self.data['uncompressed_size']))
+
     def decompressor(self):
         decompressor = Compression.decompressor(self.data['magic'])
-        if self.l4dochecksum and self.data['magic'] == 'L4':
-            def decompress(bytes):
-                import xxhash
-                out = decompressor(bytes, uncompressed_size=self.data['uncompressed_size'])
-                if xxhash.xxh64(out).intdigest() != self.data['checksum']:
-                    raise RuntimeError("Checksum mismatch while decompressing")
-                return out
 
-            return decompress
-        return partial(decompressor, uncompressed_size=self.data['uncompressed_size'])
+        def decompress(bytes):
+            self.verify(bytes)
+            return decompressor(bytes, uncompressed_size=self.data['uncompressed_size'])
+
+        return decompress
 
 
 class TObject(TStreamed):
-    header1 = NamedStruct(">HII", ['whatsthis', 'fBits', 'fUniqueID'])
+    header1 = NamedStruct(">HII", ['whatsthis', 'fUniqueID', 'fBits'])
+    kIsReferenced = 1 << 4
 
     def read(self, buffer, offset=0):
         offset = super().read(buffer, offset)
         fields, offset = TObject.header1.unpack_from(buffer, offset)
         self.data.update(fields)
+        if self.data['fBits'] & TObject.kIsReferenced:
+            offset += 2  # process id
         if type(self) is TObject:
             self.check(offset)
         return offset
@@ -316,54 +545,866 @@ class TAttLine(TStreamed):
         return offset
 
 
+class TObjArray(TObject, Sequence):
+    header2 = NamedStruct(">ii", ['fSize', 'fLowerBound'])
+
+    def __init__(self):
+        super().__init__()
+        self._items = []
+        self.data['items'] = self._items
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset)
+        self.data['fName'], offset = TString.readstring(buffer, offset)
+        fields, offset = TObjArray.header2.unpack_from(buffer, offset)
+        self.data.update(fields)
+        for _ in range(self.data['fSize']):
+            item, offset = read_object_any(buffer, offset, context)
+            self._items.append(item)
+        self.check(offset)
+        return offset
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class TIOFeatures(TStreamed):
+    header2 = NamedStruct(">4xB", 'fIOBits')
+
+    def read(self, buffer, offset=0):
+        offset = super().read(buffer, offset)
+        self.data['fIOBits'], offset = TIOFeatures.header2.unpack_from(buffer, offset)
+        self.check(offset)
+        return offset
+
+
+class TLeaf(TStreamed):
+    header1 = NamedStruct(">iii??", ['fLen', 'fLenType', 'fOffset', 'fIsRange', 'fIsUnsigned'])
+    # fields of the concrete leaf types after the TLeaf base, None if not unpacked
+    header2 = None
+    # on-disk (signed, unsigned) element type, None if not a plain number
+    dtypes = None
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset)
+        if type(self) is not TLeaf:
+            # concrete leaf types have their own header wrapping the TLeaf one
+            base = TLeaf()
+            offset = base.read(buffer, offset, context)
+            self.data['TLeaf'] = base
+            if self.header2 is not None:
+                fields, offset = self.header2.unpack_from(buffer, offset)
+                self.data.update(fields)
+            # anything else (e.g. float16 ranges) is skipped
+            offset = self._end
+            return offset
+        self.data['TNamed'] = TNamed()
+        offset = self.data['TNamed'].read(buffer, offset)
+        fields, offset = TLeaf.header1.unpack_from(buffer, offset)
+        self.data.update(fields)
+        self.data['fLeafCount'], offset = read_object_any(buffer, offset, context)
+        self.check(offset)
+        return offset
+
+    @property
+    def leafdata(self):
+        '''The TLeaf base fields'''
+        return self.data['TLeaf'].data if 'TLeaf' in self.data else self.data
+
+    @property
+    def name(self):
+        return self.leafdata['TNamed'].data['fName']
+
+    @property
+    def dtype(self):
+        if self.dtypes is None:
+            return None
+        return numpy.dtype(self.dtypes[self.leafdata['fIsUnsigned']])
+
+
+def _leaftype(name, sformat, dtypes):
+    header2 = NamedStruct(sformat, ['fMinimum', 'fMaximum']) if sformat is not None else None
+    return type(name, (TLeaf,), {'header2': header2, 'dtypes': dtypes})
+
+
+TLeafO = _leaftype('TLeafO', '>??', ('?', '?'))
+TLeafB = _leaftype('TLeafB', '>bb', ('i1', 'u1'))
+TLeafS = _leaftype('TLeafS', '>hh', ('>i2', '>u2'))
+TLeafI = _leaftype('TLeafI', '>ii', ('>i4', '>u4'))
+TLeafL = _leaftype('TLeafL', '>qq', ('>i8', '>u8'))
+TLeafG = _leaftype('TLeafG', '>qq', ('>i8', '>u8'))
+TLeafF = _leaftype('TLeafF', '>ff', ('>f4', '>f4'))
+TLeafD = _leaftype('TLeafD', '>dd', ('>f8', '>f8'))
+TLeafC = _leaftype('TLeafC', '>ii', None)
+TLeafF16 = _leaftype('TLeafF16', None, None)
+TLeafD32 = _leaftype('TLeafD32', None, None)
+
+
+class TLeafElement(TLeaf):
+    header2 = NamedStruct(">ii", ['fID', 'fType'])
+
+
+class TBranch(TStreamed):
+    header_v10 = NamedStruct(
+        ">iiiiqiIiqqq",
+        ['fCompress', 'fBasketSize', 'fEntryOffsetLen', 'fWriteBasket', 'fEntryNumber', 'fOffset', 'fMaxBaskets', 'fSplitLevel', 'fEntries', 'fTotBytes', 'fZipBytes']
+    )
+    header_v11 = NamedStruct(
+        ">iiiiqiIiqqqq",
+        ['fCompress', 'fBasketSize', 'fEntryOffsetLen', 'fWriteBasket', 'fEntryNumber', 'fOffset', 'fMaxBaskets', 'fSplitLevel', 'fEntries', 'fFirstEntry', 'fTotBytes', 'fZipBytes']
+    )
+    header_v13a = NamedStruct(">iiiiq", ['fCompress', 'fBasketSize', 'fEntryOffsetLen', 'fWriteBasket', 'fEntryNumber'])
+    header_v13b = NamedStruct(">iIiqqqq", ['fOffset', 'fMaxBaskets', 'fSplitLevel', 'fEntries', 'fFirstEntry', 'fTotBytes', 'fZipBytes'])
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset)
+        version = self.data['fVersion']
+        if type(self) is not TBranch:
+            base = TBranch()
+            offset = base.read(buffer, offset, context)
+            self.data['TBranch'] = base
+            return offset
+
+        self.data['TNamed'] = TNamed()
+        offset = self.data['TNamed'].read(buffer, offset)
+        offset = TStreamed().read(buffer, offset)  # TAttFill
+        if version == 10:
+            fields, offset = TBranch.header_v10.unpack_from(buffer, offset)
+            self.data.update(fields)
+        elif version in (11, 12):
+            fields, offset = TBranch.header_v11.unpack_from(buffer, offset)
+            self.data.update(fields)
+        elif version == 13:
+            fields, offset = TBranch.header_v13a.unpack_from(buffer, offset)
+            self.data.update(fields)
+            self.data['fIOFeatures'] = TIOFeatures()
+            offset = self.data['fIOFeatures'].read(buffer, offset)
+            fields, offset = TBranch.header_v13b.unpack_from(buffer, offset)
+            self.data.update(fields)
+        else:
+            raise RuntimeError("Unknown TBranch class version %d" % version)
+
+        self.data['fBranches'] = TObjArray()
+        offset = self.data['fBranches'].read(buffer, offset, context)
+        self.data['fLeaves'] = TObjArray()
+        offset = self.data['fLeaves'].read(buffer, offset, context)
+        # baskets still in memory when the tree was written, not supported
+        offset = TStreamed().read(buffer, offset)  # fBaskets
+        nbaskets = self.data['fMaxBaskets']
+        self.data['fBasketBytes'], offset = readarray(buffer, offset, '>i4', nbaskets)
+        self.data['fBasketEntry'], offset = readarray(buffer, offset, '>i8', nbaskets)
+        self.data['fBasketSeek'], offset = readarray(buffer, offset, '>i8', nbaskets)
+        self.data['fFileName'], offset = TString.readstring(buffer, offset)
+        self.check(offset)
+        return offset
+
+    @property
+    def branchdata(self):
+        '''The TBranch base fields'''
+        return self.data['TBranch'].data if 'TBranch' in self.data else self.data
+
+    @property
+    def name(self):
+        return self.branchdata['TNamed'].data['fName']
+
+    @property
+    def branches(self):
+        return self.branchdata['fBranches']
+
+    @property
+    def leaves(self):
+        return self.branchdata['fLeaves']
+
+    @property
+    def basket_seek(self):
+        data = self.branchdata
+        return data['fBasketSeek'][:data['fWriteBasket']]
+
+    @property
+    def basket_bytes(self):
+        data = self.branchdata
+        return data['fBasketBytes'][:data['fWriteBasket']]
+
+    @property
+    def basket_entry(self):
+        '''First entry of each basket, plus the entry past the end of the last'''
+        data = self.branchdata
+        return data['fBasketEntry'][:data['fWriteBasket'] + 1]
+
+
+class TBranchElement(TBranch):
+    header2_v8 = NamedStruct(">Iiiiii", ['fCheckSum', 'fClassVersion', 'fID', 'fType', 'fStreamerType', 'fMaximum'])
+    header2_v10 = NamedStruct(">Ihiiii", ['fCheckSum', 'fClassVersion', 'fID', 'fType', 'fStreamerType', 'fMaximum'])
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset, context)
+        self.data['fClassName'], offset = TString.readstring(buffer, offset)
+        self.data['fParentName'], offset = TString.readstring(buffer, offset)
+        self.data['fClonesName'], offset = TString.readstring(buffer, offset)
+        if self.data['fVersion'] >= 10:
+            fields, offset = TBranchElement.header2_v10.unpack_from(buffer, offset)
+        else:
+            fields, offset = TBranchElement.header2_v8.unpack_from(buffer, offset)
+        self.data.update(fields)
+        self.data['fBranchCount'], offset = read_object_any(buffer, offset, context)
+        self.data['fBranchCount2'], offset = read_object_any(buffer, offset, context)
+        self.check(offset)
+        return offset
+
+
+class TBranchObject(TBranch):
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset, context)
+        self.data['fClassName'], offset = TString.readstring(buffer, offset)
+        self.check(offset)
+        return offset
+
+
+class TArray(ROOTObject):
+    '''Base for the TArrayX members, which carry no streamer header
+
+    fArray is a view of the buffer in the on-disk (big-endian) byte order, not a copy.
+    '''
+    nData = NamedStruct(">i", 'fN')
+    dtype = None
+
+    def read(self, buffer, offset=0, context=None):
+        self.data['fN'], offset = TArray.nData.unpack_from(buffer, offset)
+        self.data['fArray'] = numpy.frombuffer(buffer, dtype=self.dtype, count=self.data['fN'], offset=offset)
+        return offset + self.data['fN'] * self.data['fArray'].itemsize
+
+
+def _arraytype(name, dtype):
+    return type(name, (TArray,), {'dtype': numpy.dtype(dtype)})
+
+
+TArrayC = _arraytype('TArrayC', 'i1')
+TArrayS = _arraytype('TArrayS', '>i2')
+TArrayI = _arraytype('TArrayI', '>i4')
+TArrayL = _arraytype('TArrayL', '>i8')
+TArrayL64 = _arraytype('TArrayL64', '>i8')
+TArrayF = _arraytype('TArrayF', '>f4')
+TArrayD = _arraytype('TArrayD', '>f8')
+
+
+class TList(TObject, Sequence):
+    nObjects = NamedStruct(">i", 'fSize')
+
+    def __init__(self):
+        super().__init__()
+        self._items = []
+        self.data['items'] = self._items
+        self.data['options'] = []
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset)
+        self.data['fName'], offset = TString.readstring(buffer, offset)
+        self.data['fSize'], offset = TList.nObjects.unpack_from(buffer, offset)
+        for _ in range(self.data['fSize']):
+            item, offset = read_object_any(buffer, offset, context)
+            self._items.append(item)
+            option, offset = TString.readstring(buffer, offset)
+            self.data['options'].append(option)
+        self.check(offset)
+        return offset
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class TAxis(TStreamed):
+    supers = [TNamed, TStreamed]  # TAttAxis
+    header2 = NamedStruct(">idd", ['fNbins', 'fXmin', 'fXmax'])
+    header3 = NamedStruct(">iiH?", ['fFirst', 'fLast', 'fBits2', 'fTimeDisplay'])
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset)
+        for cls in TAxis.supers:
+            superinfo = cls()
+            offset = superinfo.read(buffer, offset)
+            self.data[cls.__name__] = superinfo
+        fields, offset = TAxis.header2.unpack_from(buffer, offset)
+        self.data.update(fields)
+        self.data['fXbins'] = TArrayD()
+        offset = self.data['fXbins'].read(buffer, offset)
+        fields, offset = TAxis.header3.unpack_from(buffer, offset)
+        self.data.update(fields)
+        self.data['fTimeFormat'], offset = TString.readstring(buffer, offset)
+        self.data['fLabels'], offset = read_object_any(buffer, offset, context)
+        self.data['fModLabs'], offset = read_object_any(buffer, offset, context)
+        self.check(offset)
+        return offset
+
+    @property
+    def name(self):
+        return self.data['TNamed'].data['fName']
+
+    @property
+    def edges(self):
+        '''The fNbins + 1 bin edges, excluding the under- and overflow'''
+        if self.data['fXbins'].data['fN'] > 0:
+            return self.data['fXbins'].data['fArray']
+        return numpy.linspace(self.data['fXmin'], self.data['fXmax'], self.data['fNbins'] + 1)
+
+
+class TH1(TStreamed):
+    supers = [TNamed, TAttLine, TStreamed, TStreamed]  # TAttFill, TAttMarker
+    nCells = NamedStruct(">i", 'fNcells')
+    header2 = NamedStruct(
+        ">hhdddddddd",
+        ['fBarOffset', 'fBarWidth', 'fEntries', 'fTsumw', 'fTsumw2', 'fTsumwx', 'fTsumwx2', 'fMaximum', 'fMinimum', 'fNormFactor']
+    )
+    bufferSize = NamedStruct(">i", 'fBufferSize')
+    header3_v7 = NamedStruct(">i", ['fBinStatErrOpt'])
+    header3_v8 = NamedStruct(">ii", ['fBinStatErrOpt', 'fStatOverflows'])
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset)
+        version = self.data['fVersion']
+        if version < 6:
+            raise RuntimeError("Unknown TH1 class version %d" % version)
+        for cls in TH1.supers:
+            superinfo = cls()
+            offset = superinfo.read(buffer, offset)
+            self.data[cls.__name__] = superinfo
+        self.data['fNcells'], offset = TH1.nCells.unpack_from(buffer, offset)
+        for name in ('fXaxis', 'fYaxis', 'fZaxis'):
+            self.data[name] = TAxis()
+            offset = self.data[name].read(buffer, offset, context)
+        fields, offset = TH1.header2.unpack_from(buffer, offset)
+        self.data.update(fields)
+        self.data['fContour'] = TArrayD()
+        offset = self.data['fContour'].read(buffer, offset)
+        self.data['fSumw2'] = TArrayD()
+        offset = self.data['fSumw2'].read(buffer, offset)
+        self.data['fOption'], offset = TString.readstring(buffer, offset)
+        self.data['fFunctions'] = TList()
+        offset = self.data['fFunctions'].read(buffer, offset, context)
+        self.data['fBufferSize'], offset = TH1.bufferSize.unpack_from(buffer, offset)
+        self.data['fBuffer'], offset = readarray(buffer, offset, '>f8', self.data['fBufferSize'])
+        if version >= 8:
+            fields, offset = TH1.header3_v8.unpack_from(buffer, offset)
+            self.data.update(fields)
+        elif version == 7:
+            fields, offset = TH1.header3_v7.unpack_from(buffer, offset)
+            self.data.update(fields)
+        self.check(offset)
+        return offset
+
+
+class TH2(TStreamed):
+    header2 = NamedStruct(">dddd", ['fScalefactor', 'fTsumwy', 'fTsumwy2', 'fTsumwxy'])
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset)
+        self.data['TH1'] = TH1()
+        offset = self.data['TH1'].read(buffer, offset, context)
+        fields, offset = TH2.header2.unpack_from(buffer, offset)
+        self.data.update(fields)
+        self.check(offset)
+        return offset
+
+
+class TH3(TStreamed):
+    header2 = NamedStruct(">ddddddd", ['fTsumwy', 'fTsumwy2', 'fTsumwxy', 'fTsumwz', 'fTsumwz2', 'fTsumwxz', 'fTsumwyz'])
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset)
+        self.data['TH1'] = TH1()
+        offset = self.data['TH1'].read(buffer, offset, context)
+        self.data['TAtt3D'] = TStreamed()
+        offset = self.data['TAtt3D'].read(buffer, offset)
+        fields, offset = TH3.header2.unpack_from(buffer, offset)
+        self.data.update(fields)
+        self.check(offset)
+        return offset
+
+
+class THistogram(TStreamed):
+    '''Base for the concrete histogram types, a TH1, TH2 or TH3 base followed by the bin contents array
+
+    values and sumw2 are views of the object buffer shaped (x, y, z) including
+    the under- and overflow bins, so that no per-bin unpacking is done.
+    '''
+    base = None
+    array = None
+    ndim = None
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset)
+        base = self.base()
+        offset = base.read(buffer, offset, context)
+        self.data[self.base.__name__] = base
+        self.data['fArray'] = self.array()
+        offset = self.data['fArray'].read(buffer, offset)
+        self.check(offset)
+        return offset
+
+    @property
+    def histdata(self):
+        '''The TH1 base fields'''
+        base = self.data[self.base.__name__]
+        return base.data if self.base is TH1 else base.data['TH1'].data
+
+    @property
+    def name(self):
+        return self.histdata['TNamed'].data['fName']
+
+    @property
+    def axes(self):
+        return [self.histdata[name] for name in ('fXaxis', 'fYaxis', 'fZaxis')[:self.ndim]]
+
+    def _shaped(self, array):
+        shape = [axis.data['fNbins'] + 2 for axis in self.axes]
+        # ROOT bin number is x + (nx + 2) * (y + (ny + 2) * z)
+        return array.reshape(shape[::-1]).T
+
+    @property
+    def values(self):
+        return self._shaped(self.data['fArray'].data['fArray'])
+
+    @property
+    def sumw2(self):
+        '''Sum of squared weights per bin, or None if not stored (unweighted fill)'''
+        sumw2 = self.histdata['fSumw2'].data
+        if sumw2['fN'] == 0:
+            return None
+        return self._shaped(sumw2['fArray'])
+
+
+def _histtype(name, base, ndim, array):
+    return type(name, (THistogram,), {'base': base, 'ndim': ndim, 'array': array})
+
+
+TH1C = _histtype('TH1C', TH1, 1, TArrayC)
+TH1S = _histtype('TH1S', TH1, 1, TArrayS)
+TH1I = _histtype('TH1I', TH1, 1, TArrayI)
+TH1F = _histtype('TH1F', TH1, 1, TArrayF)
+TH1D = _histtype('TH1D', TH1, 1, TArrayD)
+TH2C = _histtype('TH2C', TH2, 2, TArrayC)
+TH2S = _histtype('TH2S', TH2, 2, TArrayS)
+TH2I = _histtype('TH2I', TH2, 2, TArrayI)
+TH2F = _histtype('TH2F', TH2, 2, TArrayF)
+TH2D = _histtype('TH2D', TH2, 2, TArrayD)
+TH3C = _histtype('TH3C', TH3, 3, TArrayC)
+TH3S = _histtype('TH3S', TH3, 3, TArrayS)
+TH3I = _histtype('TH3I', TH3, 3, TArrayI)
+TH3F = _histtype('TH3F', TH3, 3, TArrayF)
+TH3D = _histtype('TH3D', TH3, 3, TArrayD)
+
+
+class TStreamerElement(TStreamed):
+    header2 = NamedStruct(">iiii", ['fType', 'fSize', 'fArrayLength', 'fArrayDim'])
+    nMaxIndex = NamedStruct(">i", 'n')
+
+    def read(self, buffer, offset=0, context=None):
+        offset = super().read(buffer, offset)
+        if type(self) is not TStreamerElement:
+            # concrete element types have their own header wrapping the TStreamerElement one
+            base = TStreamerElement()
+            offset = base.read(buffer, offset)
+            self.data['TStreamerElement'] = base
+            offset = self.readextra(buffer, offset)
+            self.check(offset)
+            return offset
+        self.data['TNamed'] = TNamed()
+        offset = self.data['TNamed'].read(buffer, offset)
+        fields, offset = TStreamerElement.header2.unpack_from(buffer, offset)
+        self.data.update(fields)
+        nmax = 5
+        if self.data['fVersion'] == 1:
+            nmax, offset = TStreamerElement.nMaxIndex.unpack_from(buffer, offset)
+        self.data['fMaxIndex'] = numpy.frombuffer(buffer, dtype='>i4', count=nmax, offset=offset)
+        offset += 4 * nmax
+        self.data['fTypeName'], offset = TString.readstring(buffer, offset)
+        if self.data['fType'] == 11 and self.data['fTypeName'] in (b'Bool_t', b'bool'):
+            self.data['fType'] = 18
+        self.check(offset)
+        return offset
+
+    def readextra(self, buffer, offset):
+        '''Read the fields of the concrete element type after the TStreamerElement base'''
+        return offset
+
+    @property
+    def elementdata(self):
+        '''The TStreamerElement base fields'''
+        return self.data['TStreamerElement'].data if 'TStreamerElement' in self.data else self.data
+
+    @property
+    def name(self):
+        return self.elementdata['TNamed'].data['fName']
+
+    @property
+    def title(self):
+        return self.elementdata['TNamed'].data['fTitle']
+
+
+class TStreamerBase(TStreamerElement):
+    header3 = NamedStruct(">i", 'fBaseVersion')
+
+    def readextra(self, buffer, offset):
+        if self.data['fVersion'] >= 2:
+            self.data['fBaseVersion'], offset = TStreamerBase.header3.unpack_from(buffer, offset)
+        return offset
+
+
+class TStreamerBasicPointer(TStreamerElement):
+    header3 = NamedStruct(">i", 'fCountVersion')
+
+    def readextra(self, buffer, offset):
+        self.data['fCountVersion'], offset = TStreamerBasicPointer.header3.unpack_from(buffer, offset)
+        self.data['fCountName'], offset = TString.readstring(buffer, offset)
+        self.data['fCountClass'], offset = TString.readstring(buffer, offset)
+        return offset
+
+
+class TStreamerLoop(TStreamerBasicPointer):
+    pass
+
+
+class TStreamerSTL(TStreamerElement):
+    header3 = NamedStruct(">ii", ['fSTLtype', 'fCtype'])
+
+    def readextra(self, buffer, offset):
+        fields, offset = TStreamerSTL.header3.unpack_from(buffer, offset)
+        self.data.update(fields)
+        return offset
+
+
+class TStreamerSTLstring(TStreamerSTL):
+    pass
+
+
+class TStreamerBasicType(TStreamerElement):
+    pass
+
+
+class TStreamerString(TStreamerElement):
+    pass
+
+
+class TStreamerObject(TStreamerElement):
+    pass
+
+
+class TStreamerObjectAny(TStreamerElement):
+    pass
+
+
+class TStreamerObjectPointer(TStreamerElement):
+    pass
+
+
+class TStreamerObjectAnyPointer(TStreamerElement):
+    pass
+
+
+class TStreamerArtificial(TStreamerElement):
+    pass
+
+
+class TStreamerInfo(TStreamed):
+    header2 = NamedStruct(">Ii", ['fCheckSum', 'fClassVersion'])
+
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
+        offset = super().read(buffer, offset)
+        self.data['TNamed'] = TNamed()
+        offset = self.data['TNamed'].read(buffer, offset)
+        fields, offset = TStreamerInfo.header2.unpack_from(buffer, offset)
+        self.data.update(fields)
+        self.data['fElements'], offset = read_object_any(buffer, offset, context)
+        self.check(offset)
+        return offset
+
+    @property
+    def name(self):
+        return self.data['TNamed'].data['fName']
+
+    @property
+    def elements(self):
+        return list(self.data['fElements'] or [])
+
+
 class TTree(TStreamed):
     supers = [TNamed, TAttLine, TStreamed, TStreamed]  # TAttFill, TAttMarker
-    header_v20 = NamedStruct(
+    header_v16 = NamedStruct(
+        ">qqqqdiiiqqqqq",
+        [
+            'fEntries', 'fTotBytes', 'fZipBytes', 'fSavedBytes', 'fWeight', 'fTimerInterval', 'fScanField', 'fUpdate',
+            'fMaxEntries', 'fMaxEntryLoop', 'fMaxVirtualSize', 'fAutoSave', 'fEstimate'
+        ]
+    )
+    header_v17 = NamedStruct(
+        ">qqqqdiiiiqqqqq",
+        [
+            'fEntries', 'fTotBytes', 'fZipBytes', 'fSavedBytes', 'fWeight', 'fTimerInterval', 'fScanField', 'fUpdate',
+            'fDefaultEntryOffsetLen', 'fMaxEntries', 'fMaxEntryLoop', 'fMaxVirtualSize', 'fAutoSave', 'fEstimate'
+        ]
+    )
+    header_v18 = NamedStruct(
+        ">qqqqqdiiiiqqqqqq",
+        [
+            'fEntries', 'fTotBytes', 'fZipBytes', 'fSavedBytes', 'fFlushedBytes', 'fWeight', 'fTimerInterval', 'fScanField',
+            'fUpdate', 'fDefaultEntryOffsetLen', 'fMaxEntries', 'fMaxEntryLoop', 'fMaxVirtualSize', 'fAutoSave', 'fAutoFlush',
+            'fEstimate'
+        ]
+    )
+    header_v19 = NamedStruct(
         ">qqqqqdiiiiIqqqqqq",
         [
             'fEntries', 'fTotBytes', 'fZipBytes', 'fSavedBytes', 'fFlushedBytes', 'fWeight',
             'fTimerInterval', 'fScanField', 'fUpdate', 'fDefaultEntryOffsetLen', 'fNClusterRange',
             'fMaxEntries', 'fMaxEntryLoop', 'fMaxVirtualSize', 'fAutoSave', 'fAutoFlush', 'fEstimate',
-            'fClusterRangeEnd', 'fClusterSize', 'fIOFeatures', 'fBranches', 'fLeaves', 'fAliases',
-            'fIndexValues', 'fIndex', 'fTreeIndex', 'fFriends'
         ]
     )
+    headers = {16: header_v16, 17: header_v17, 18: header_v18, 19: header_v19, 20: header_v19}
 
-    def read(self, buffer, offset=0):
+    def read(self, buffer, offset=0, context=None):
+        if context is None:
+            context = ObjectContext()
         offset = super().read(buffer, offset)
         for cls in TTree.supers:
             superinfo = cls()
             offset = superinfo.read(buffer, offset)
             self.data[cls.__name__] = superinfo
 
-        if self.data['fVersion'] == 20:
-            fields, offset = TTree.header_v20.unpack_from(buffer, offset)
-            self.data.update(fields)
-        else:
-            raise RuntimeError("Unknown TTree class version")
-        # print(buffer[offset:offset + 60])
-        # from uproot:
-        # fBasketSeek_dtype = cls._dtype1
-        # if getattr(context, "speedbump", True):
-        #     cursor.skip(1)
-        # self._fClusterRangeEnd = cursor.array(source, self._fNClusterRange, fBasketSeek_dtype)
-        # fBasketSeek_dtype = cls._dtype2
-        # if getattr(context, "speedbump", True):
-        #     cursor.skip(1)
-        # self._fClusterSize = cursor.array(source, self._fNClusterRange, fBasketSeek_dtype)
-        # self._fIOFeatures = ROOT_3a3a_TIOFeatures.read(source, cursor, context, self)
-        # self._fBranches = TObjArray.read(source, cursor, context, self)
-        # self._fLeaves = TObjArray.read(source, cursor, context, self)
-        # self._fAliases = _readobjany(source, cursor, context, parent)
-        # self._fIndexValues = TArrayD.read(source, cursor, context, self)
-        # self._fIndex = TArrayI.read(source, cursor, context, self)
-        # self._fTreeIndex = _readobjany(source, cursor, context, parent)
-        # self._fFriends = _readobjany(source, cursor, context, parent)
-        # _readobjany(source, cursor, context, parent, asclass=Undefined)
-        # _readobjany(source, cursor, context, parent, asclass=Undefined)
+        version = self.data['fVersion']
+        if version not in TTree.headers:
+            raise RuntimeError("Unknown TTree class version %d" % version)
+        fields, offset = TTree.headers[version].unpack_from(buffer, offset)
+        self.data.update(fields)
+        if version >= 19:
+            nrange = self.data['fNClusterRange']
+            self.data['fClusterRangeEnd'], offset = readarray(buffer, offset, '>i8', nrange)
+            self.data['fClusterSize'], offset = readarray(buffer, offset, '>i8', nrange)
+        if version >= 20:
+            self.data['fIOFeatures'] = TIOFeatures()
+            offset = self.data['fIOFeatures'].read(buffer, offset)
+        self.data['fBranches'] = TObjArray()
+        offset = self.data['fBranches'].read(buffer, offset, context)
+        self.data['fLeaves'] = TObjArray()
+        offset = self.data['fLeaves'].read(buffer, offset, context)
+        self.data['fAliases'], offset = read_object_any(buffer, offset, context)
+        self.data['fIndexValues'] = TArrayD()
+        offset = self.data['fIndexValues'].read(buffer, offset)
+        self.data['fIndex'] = TArrayI()
+        offset = self.data['fIndex'].read(buffer, offset)
+        self.data['fTreeIndex'], offset = read_object_any(buffer, offset, context)
+        self.data['fFriends'], offset = read_object_any(buffer, offset, context)
+        self.data['fUserInfo'], offset = read_object_any(buffer, offset, context)
+        self.data['fBranchRef'], offset = read_object_any(buffer, offset, context)
+        self.check(offset)
         return offset
 
-
+    @property
+    def branches(self):
+        '''All branches, including sub-branches, by name'''
+        out = {}
+        stack = list(self.data['fBranches'])
+        while stack:
+            branch = stack.pop(0)
+            out[branch.name] = branch
+            stack.extend(branch.branches)
+        return out
+
+    def clusters(self, branchnames=None):
+        '''Entry boundaries of the clusters, starting at 0 and ending at fEntries
+
+        Follows TTree::TClusterIterator: each cluster range up to fClusterRangeEnd
+        is split by its fClusterSize, and the remainder by fAutoFlush.  Where no
+        cluster size is recorded (fAutoFlush given in bytes), the entries where
+        all of the given branches (default all) start a basket are used instead.
+        '''
+        nentries = self.data['fEntries']
+        bounds = [0]
+
+        def split(stop, size):
+            if size <= 0:
+                return False
+            bounds.extend(range(bounds[-1] + size, stop, size))
+            if bounds[-1] != stop:
+                bounds.append(stop)
+            return True
+
+        ranges = zip(self.data.get('fClusterRangeEnd', []), self.data.get('fClusterSize', []))
+        for rangeend, size in ranges:
+            if not split(min(int(rangeend) + 1, nentries), int(size) or self.data.get('fAutoFlush', 0)):
+                break
+        else:
+            if bounds[-1] == nentries or split(nentries, self.data.get('fAutoFlush', 0)):
+                return numpy.array(bounds, dtype=numpy.int64)
+
+        branches = self.branches
+        if branchnames is not None:
+            branches = {name: branches[name] for name in branchnames}
+        common = None
+        for branch in branches.values():
+            edges = branch.basket_entry[branch.basket_entry >= bounds[-1]]
+            common = edges if common is None else numpy.intersect1d(common, edges)
+        if common is not None:
+            bounds.extend(int(e) for e in common if bounds[-1] < e < nentries)
+        if bounds[-1] != nentries:
+            bounds.append(nentries)
+        return numpy.array(bounds, dtype=numpy.int64)
+
+    async def array(self, branchname, entry_start=None, entry_stop=None):
+        '''Read a branch into a numpy array, through the ROOTFile this tree was read from'''
+        return await self.file.read_array(self, branchname, entry_start, entry_stop)
+
+    def iterate(self, branchnames, step=None, prefetch=2, max_bytes=None):
+        '''Asynchronously iterate over cluster-aligned chunks of branches, see ROOTFile.iterate'''
+        return self.file.iterate(self, branchnames, step, prefetch, max_bytes)
+
+
+# the read method of every class here takes (buffer, offset, context)
 ClassMap = {
     b'TTree': TTree,
+    b'TDirectory': TDirectoryFile,
+    b'TDirectoryFile': TDirectoryFile,
+    b'TObjArray': TObjArray,
+    b'TBranch': TBranch,
+    b'TBranchElement': TBranchElement,
+    b'TBranchObject': TBranchObject,
+    b'TLeaf': TLeaf,
+    b'TLeafO': TLeafO,
+    b'TLeafB': TLeafB,
+    b'TLeafS': TLeafS,
+    b'TLeafI': TLeafI,
+    b'TLeafL': TLeafL,
+    b'TLeafG': TLeafG,
+    b'TLeafF': TLeafF,
+    b'TLeafD': TLeafD,
+    b'TLeafC': TLeafC,
+    b'TLeafF16': TLeafF16,
+    b'TLeafD32': TLeafD32,
+    b'TLeafElement': TLeafElement,
+    b'TList': TList,
+    b'THashList': TList,
+    b'TAxis': TAxis,
+    b'TH1': TH1,
+    b'TH2': TH2,
+    b'TH3': TH3,
+    b'TArrayC': TArrayC,
+    b'TArrayS': TArrayS,
+    b'TArrayI': TArrayI,
+    b'TArrayL': TArrayL,
+    b'TArrayL64': TArrayL64,
+    b'TArrayF': TArrayF,
+    b'TArrayD': TArrayD,
+    b'TH1C': TH1C,
+    b'TH1S': TH1S,
+    b'TH1I': TH1I,
+    b'TH1F': TH1F,
+    b'TH1D': TH1D,
+    b'TH2C': TH2C,
+    b'TH2S': TH2S,
+    b'TH2I': TH2I,
+    b'TH2F': TH2F,
+    b'TH2D': TH2D,
+    b'TH3C': TH3C,
+    b'TH3S': TH3S,
+    b'TH3I': TH3I,
+    b'TH3F': TH3F,
+    b'TH3D': TH3D,
+    b'TStreamerInfo': TStreamerInfo,
+    b'TStreamerElement': TStreamerElement,
+    b'TStreamerBase': TStreamerBase,
+    b'TStreamerBasicType': TStreamerBasicType,
+    b'TStreamerBasicPointer': TStreamerBasicPointer,
+    b'TStreamerLoop': TStreamerLoop,
+    b'TStreamerString': TStreamerString,
+    b'TStreamerObject': TStreamerObject,
+    b'TStreamerObjectAny': TStreamerObjectAny,
+    b'TStreamerObjectPointer': TStreamerObjectPointer,
+    b'TStreamerObjectAnyPointer': TStreamerObjectAnyPointer,
+    b'TStreamerSTL': TStreamerSTL,
+    b'TStreamerSTLstring': TStreamerSTLstring,
+    b'TStreamerArtificial': TStreamerArtificial,
 }
+
+kByteCountMask = 0x40000000
+kClassMask = 0x80000000
+kNewClassTag = 0xFFFFFFFF
+kMapOffset = 2
+_uint32 = NamedStruct(">I", 'value')
+
+
+def read_object_any(buffer, offset, context):
+    '''Read an object that may be a new instance of any class or a reference to one already read
+
+    Returns (object, offset); the object is None for null pointers, unresolved
+    references, and classes neither in ClassMap nor in context.streamers
+    (which are skipped over).
+    '''
+    beg = offset
+    bcnt, offset = _uint32.unpack_from(buffer, offset)
+    if not (bcnt & kByteCountMask) or bcnt == kNewClassTag:
+        start = None
+        tag = bcnt
+        bcnt = 0
+    else:
+        start = offset
+        tag, offset = _uint32.unpack_from(buffer, offset)
+        bcnt &= ~kByteCountMask
+
+    if not (tag & kClassMask):
+        # reference to an object already read
+        if tag == 0:
+            return None, offset
+        if tag not in context.refs:
+            return None, (beg + bcnt + 4 if bcnt else offset)
+        return context.refs[tag], offset
+    elif tag == kNewClassTag:
+        end = bytes(buffer[offset:offset + 256]).index(b'\x00')
+        classname, offset = bytes(buffer[offset:offset + end]), offset + end + 1
+        cls = ClassMap.get(classname)
+        if cls is None and context.streamers is not None:
+            cls = context.streamers.classfor(classname)
+        if start is not None:
+            context.refs[start + context.origin + kMapOffset] = cls
+        else:
+            context.refs[len(context.refs) + 1] = cls
+    else:
+        cls = context.refs.get(tag & ~kClassMask)
+
+    if cls is None:
+        # unknown class, skip over it using the byte count
+        return None, beg + bcnt + 4
+    obj = cls()
+    offset = obj.read(buffer, offset, context)
+    if start is not None:
+        context.refs[beg + context.origin + kMapOffset] = obj
+    else:
+        context.refs[len(context.refs) + 1] = obj
+    return obj, offset
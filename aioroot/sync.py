@@ -0,0 +1,139 @@
+'''Blocking interface for synchronous code
+
+All calls are run on one event loop in a background thread, shared by every
+caller in the process, so that files opened from different threads still have
+their reads and decompression overlap::
+
+    for url, entries in aioroot.sync.numentries(urls, b'Events'):
+        ...
+    with aioroot.sync.open(url) as file:
+        tree = file[b'Events']
+'''
+import asyncio
+import threading
+from .rootfile import ROOTFile
+from . import bulk
+
+
+async def _anext(agen):
+    return await agen.__anext__()
+
+
+class _LoopThread:
+    '''An event loop running forever in a daemon thread, started on first use'''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='aioroot-loop', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro):
+        '''Schedule coro on the loop, returning a concurrent.futures.Future'''
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Blocking aioroot.sync call made from the aioroot event loop, await the async API instead")
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run(self, coro, timeout=None):
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # timed out or interrupted, do not leave the work running on the loop
+            future.cancel()
+            raise
+
+    def iterate(self, agen):
+        '''Iterate an async generator from synchronous code, closing it if abandoned'''
+        try:
+            while True:
+                try:
+                    yield self.run(_anext(agen))
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+
+_runner = _LoopThread()
+
+
+def submit(coro):
+    '''Run coro on the shared background loop, returning a concurrent.futures.Future'''
+    return _runner.submit(coro)
+
+
+def run(coro, timeout=None):
+    '''Run coro on the shared background loop and wait for its result, cancelling it after timeout seconds'''
+    return _runner.run(coro, timeout)
+
+
+class File:
+    '''Blocking wrapper of an open ROOTFile, see open'''
+    def __init__(self, rootfile):
+        self.aiofile = rootfile
+
+    def __getitem__(self, key):
+        return _runner.run(self.aiofile[key])
+
+    def keys(self):
+        return self.aiofile.keys()
+
+    @property
+    def data(self):
+        return self.aiofile.data
+
+    @property
+    def stats(self):
+        return self.aiofile.stats
+
+    def get_many(self, keynames, **kwargs):
+        return _runner.run(self.aiofile.get_many(keynames, **kwargs))
+
+    def walk(self):
+        return _runner.iterate(self.aiofile.walk())
+
+    def streamers(self):
+        return _runner.run(self.aiofile.streamers())
+
+    def read_array(self, tree, branchname, entry_start=None, entry_stop=None):
+        return _runner.run(self.aiofile.read_array(tree, branchname, entry_start, entry_stop))
+
+    def iterate(self, tree, branchnames, **kwargs):
+        return _runner.iterate(self.aiofile.iterate(tree, branchnames, **kwargs))
+
+    def close(self):
+        return _runner.run(self.aiofile.close())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open(url, **options):
+    '''Open url (or a ByteSource) and return a blocking File
+
+    Keyword arguments are passed to ROOTFile.
+    '''
+    return File(_runner.run(ROOTFile(url, **options).open()))
+
+
+def fetch(urls, keyname, **kwargs):
+    '''Yield (url, object) as each file completes, see aioroot.fetch'''
+    return _runner.iterate(bulk.fetch(urls, keyname, **kwargs))
+
+
+def numentries(urls, treename, **kwargs):
+    '''Yield (url, number of entries in treename) as each file completes, see aioroot.numentries'''
+    return _runner.iterate(bulk.numentries(urls, treename, **kwargs))
@@ -0,0 +1,163 @@
+import json
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Stats:
+    '''Aggregate counters and latency histograms of spans, by span name
+
+    The histograms have power-of-two bins in microseconds: bin i counts the
+    spans that took from 2**(i-1) up to 2**i microseconds.
+    '''
+    nbins = 32
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        # name: [count, bytes, seconds, errors]
+        self.counters = {}
+        self.histograms = {}
+
+    def add(self, name, seconds, nbytes=0, error=False):
+        ibin = min(int(seconds * 1e6).bit_length(), self.nbins - 1)
+        with self._lock:
+            if name not in self.counters:
+                self.counters[name] = [0, 0, 0., 0]
+                self.histograms[name] = [0] * self.nbins
+            counter = self.counters[name]
+            counter[0] += 1
+            counter[1] += nbytes
+            counter[2] += seconds
+            counter[3] += error
+            self.histograms[name][ibin] += 1
+
+    def summary(self):
+        '''{name: {'count', 'bytes', 'seconds', 'errors', 'histogram'}}, histogram keyed by bin upper edge in seconds'''
+        with self._lock:
+            return {
+                name: {
+                    'count': count,
+                    'bytes': nbytes,
+                    'seconds': seconds,
+                    'errors': errors,
+                    'histogram': {2**i * 1e-6: n for i, n in enumerate(self.histograms[name]) if n},
+                }
+                for name, (count, nbytes, seconds, errors) in self.counters.items()
+            }
+
+
+class Span:
+    '''One timed operation, finished by leaving the with block or by calling finish
+
+    attrs holds what is known about the operation (url, offset, size, server, ...),
+    and may be added to until the span finishes.
+    '''
+    def __init__(self, tracer, name, stats, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.duration = None
+        self._tracer = tracer
+        self._stats = stats
+        try:
+            self.lane = id(asyncio.current_task())
+        except RuntimeError:
+            # not in a task, e.g. a threadpool worker
+            self.lane = threading.get_ident()
+        self.start = time.perf_counter()
+
+    def finish(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.attrs['error'] = repr(error)
+        self._tracer.finish(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+
+
+class Tracer:
+    '''Collects the spans of all files in the process
+
+    Every span is added to the process-wide stats and to the stats of its file,
+    and passed to each callback.  Spans themselves are only kept while
+    recording, up to maxspans, for example to dump as a Chrome trace.
+    '''
+    def __init__(self):
+        self.stats = Stats()
+        self.callbacks = []
+        self.spans = None
+        self._epoch = time.perf_counter()
+
+    def span(self, name, stats=None, **attrs):
+        return Span(self, name, stats, attrs)
+
+    def finish(self, span):
+        error = 'error' in span.attrs
+        nbytes = span.attrs.get('size', 0)
+        self.stats.add(span.name, span.duration, nbytes, error)
+        if span._stats is not None:
+            span._stats.add(span.name, span.duration, nbytes, error)
+        if self.spans is not None:
+            self.spans.append(span)
+        for callback in self.callbacks:
+            try:
+                callback(span)
+            except Exception:
+                # a broken callback must not fail the operation it observes
+                logger.exception("Trace callback %r failed on span %s", callback, span.name)
+
+    def add_callback(self, callback):
+        '''Call callback(span) for every finished span, in the thread that finished it
+
+        Exceptions raised by callback are logged and otherwise ignored.
+        '''
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self.callbacks.remove(callback)
+
+    def record(self, maxspans=1000000):
+        '''Start keeping finished spans, the oldest are dropped beyond maxspans'''
+        self.spans = deque(maxlen=maxspans)
+
+    def stop(self):
+        '''Stop keeping spans, returning those kept'''
+        spans, self.spans = list(self.spans or []), None
+        return spans
+
+    def chrome_trace(self, spans=None):
+        '''The kept spans as a Chrome trace event dict, viewable in chrome://tracing or Perfetto'''
+        if spans is None:
+            spans = list(self.spans or [])
+        lanes = {}
+        events = []
+        for span in spans:
+            events.append({
+                'name': span.name,
+                'ph': 'X',
+                'ts': (span.start - self._epoch) * 1e6,
+                'dur': span.duration * 1e6,
+                'pid': 0,
+                'tid': lanes.setdefault(span.lane, len(lanes)),
+                'args': {k: v if isinstance(v, (int, float, str)) else repr(v) for k, v in span.attrs.items()},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump_chrome_trace(self, path, spans=None):
+        with open(path, 'w') as fout:
+            json.dump(self.chrome_trace(spans), fout)
+
+
+tracer = Tracer()
@@ -1,65 +1,417 @@
 import asyncio
+import weakref
+from collections import Counter, deque
 from functools import partial
-from pyxrootd.client import File
+from urllib.parse import urlparse
+from .source import ByteSource
+from .cache import shared_cache
+from .trace import tracer
+from .scheduler import shared_scheduler, io_priority
+from .deadline import current_deadline, request_timeout
 
 
-class XRootDFile:
-    def __init__(self, url):
-        self._url = url
+class CompletionQueue:
+    '''Completions from the xrootd callback threads, delivered to one event loop in batches
+
+    Callback threads append to a deque and only wake the loop if no drain is
+    already scheduled, so a burst of completions costs one self-pipe write and
+    one loop iteration rather than one of each per request.
+    '''
+    def __init__(self, loop):
+        self._loop = loop
+        self._items = deque()
+        self._scheduled = False
+        self.wakeups = 0
+        self.delivered = 0
+
+    def put(self, fun, *args):
+        '''Call fun(*args) in the loop thread, may be called from any thread'''
+        self._items.append((fun, args))
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        # cleared first so that an item appended during the drain schedules another
+        self._scheduled = False
+        self.wakeups += 1
+        items = self._items
+        while items:
+            fun, args = items.popleft()
+            try:
+                fun(*args)
+            except Exception as exc:
+                # report it and carry on, the rest of the batch still has to be delivered
+                self._loop.call_exception_handler({'message': 'Error delivering an xrootd completion', 'exception': exc})
+            self.delivered += 1
+
+
+_completion_queues = weakref.WeakKeyDictionary()
+
+
+def completion_queue(loop):
+    '''The CompletionQueue shared by all files read from loop'''
+    if loop not in _completion_queues:
+        _completion_queues[loop] = CompletionQueue(loop)
+    return _completion_queues[loop]
+
+
+class LatencyTracker:
+    '''Recent read latencies, to set the deadline after which a read is hedged
+
+    Quantiles are recomputed every few samples rather than on every read, and
+    are None until there are enough samples to be meaningful.
+    '''
+    def __init__(self, window=1000, minsamples=20, every=32):
+        self._samples = deque(maxlen=window)
+        self._minsamples = minsamples
+        self._every = every
+        self._sorted = None
+        self._added = 0
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+        self._added += 1
+        if self._added % self._every == 0:
+            self._sorted = None
+
+    def quantile(self, q):
+        if len(self._samples) < self._minsamples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        return self._sorted[min(int(q * len(self._sorted)), len(self._sorted) - 1)]
+
+
+# shared by all files in the process, so that a scan over many files learns the distribution quickly
+read_latency = LatencyTracker()
+
+
+def _hostid(url):
+    '''host:port of a server in an xrootd host list, where it is a pyxrootd URL object'''
+    hostid = getattr(url, 'hostid', None)
+    if hostid is None:
+        hostid = urlparse(str(url)).netloc
+    return hostid
+
+
+def _tried(url, server):
+    '''url asking the redirector not to send us to server (host:port) again'''
+    host = urlparse('//' + server).hostname if server else None
+    if host is None:
+        return url
+    return url + ('&' if '?' in url else '?') + 'tried=' + host
+
+
+class XRootDFile(ByteSource):
+    '''File read through the xrootd client
+
+    Reads slower than the hedge_quantile of recent read latencies (but at least
+    hedge_min seconds) are duplicated on a second connection, to the next replica
+    or else back through the redirector avoiding the server of the first, and the
+    first answer is used.  Failed requests are retried up to retries times with
+    exponential backoff starting at backoff seconds, moving to the next replica.
+    Each request, with its retries and hedge, holds a grant of the scheduler.
+    Requests are given no longer than the current aioroot.deadline leaves, and
+    a request whose reads are all cancelled is itself cancelled, releasing its
+    grant, with any late response dropped on arrival.
+    '''
+    def __init__(
+        self, url, coalesce_gap=4096, cache=shared_cache, replicas=(), timeout=60,
+        retries=2, backoff=0.5, hedge_quantile=None, hedge_min=0.05, latency=read_latency,
+        scheduler=shared_scheduler,
+    ):
+        from pyxrootd.client import File
+        super().__init__(url)
+        self._File = File
         self._file = File()
-        self._timeout = 60
-        self._servers = []
+        self._timeout = timeout
+        # alternative urls of the same file, tried in order after url
+        self._urls = [url] + list(replicas)
+        self._current = 0
+        self._retries = retries
+        self._backoff = backoff
+        self._hedge_quantile = hedge_quantile
+        self._hedge_min = hedge_min
+        self._latency = latency
+        self._backup = None
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        # requests cancelled as all their reads were, and responses that came back after a cancel and were dropped
+        self.abandoned = 0
+        self.dropped = 0
+        # data server (host:port) of the last response, and number of responses from each
+        self.last_server = None
+        self.server_counts = Counter()
         self._loop = None
+        self._completions = None
+        # reads issued in the same loop iteration that are closer than this are
+        # merged, and the merged ranges sent together as a vector read; None disables
+        self._coalesce_gap = coalesce_gap
+        self._vector_maxchunks = 1024
+        self._vector_maxchunksize = 2 * 1024 * 1024
+        self._pending = []
+        # block cache shared by all files in the process, None to disable
+        self._cache = cache
+        # IOScheduler limiting requests in flight across files, None to disable
+        self._scheduler = scheduler
 
-    def _handle(self, future, status, content, servers):
-        if future.cancelled():
+    def _handle(self, future, span, status, content, servers):
+        # called in an xrootd thread
+        self._completions.put(self._complete, future, span, status, content, servers)
+
+    def _complete(self, future, span, status, content, servers):
+        if servers:
+            # the last host in the list is the one that answered, after any redirects
+            self.last_server = _hostid(servers[-1]['url'])
+            self.server_counts[self.last_server] += 1
+            span.attrs['server'] = self.last_server
+        if future.done():
+            # cancelled or hedged: nobody waits on content, let it go now
+            self.dropped += 1
+            span.attrs['dropped'] = True
+            span.finish()
+            return
+        # resolved before the span finishes, so that nothing the tracer does can strand the read
+        if not status['ok']:
+            exc = IOError(status['message'].strip())
+            future.set_exception(exc)
+            span.finish(exc)
             return
-        try:
-            if not status['ok']:
-                raise IOError(status['message'].strip())
-            self._servers.append(servers)
-            self._loop.call_soon_threadsafe(future.set_result, content)
-        except Exception as exc:
-            self._loop.call_soon_threadsafe(future.set_exception, exc)
+        future.set_result(content)
+        span.finish()
 
     async def open(self):
         self._loop = asyncio.get_event_loop()
-        future = self._loop.create_future()
-        res = self._file.open(self._url, timeout=self._timeout, callback=partial(self._handle, future))
-        if not res['ok']:
-            raise IOError(res['message'].strip())
-        await future
-        return self
+        self._completions = completion_queue(self._loop)
+        for attempt in range(self._retries + 1):
+            try:
+                await self._request(self._file.open, url=self._urls[self._current])
+                return self
+            except IOError:
+                if attempt == self._retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self._backoff * 2**attempt)
+                self._current = (self._current + 1) % len(self._urls)
+                self._file = self._File()
 
     async def close(self):
+        if self._backup is not None:
+            backup, self._backup = self._backup, None
+            try:
+                await self._request((await backup).close)
+            except Exception:
+                pass
         if not self._file.is_open():
             self._file = None
             return
-        future = asyncio.get_event_loop().create_future()
-        res = self._file.close(timeout=self._timeout, callback=partial(self._handle, future))
-        if not res['ok']:
-            raise IOError(res['message'].strip())
-        await future
+        await self._request(self._file.close)
         self._file = None
         self._loop = None
 
-    async def stat(self):
+    async def _connect(self, avoid):
+        '''Open another connection to the file, on the next replica if any'''
+        if len(self._urls) > 1:
+            url = self._urls[(self._current + 1) % len(self._urls)]
+        else:
+            url = _tried(self._url, avoid)
+        handle = self._File()
+        await self._request(handle.open, url=url)
+        return handle
+
+    def _backup_handle(self):
+        failed = self._backup is not None and self._backup.done() and (self._backup.cancelled() or self._backup.exception() is not None)
+        if self._backup is None or failed:
+            self._backup = asyncio.ensure_future(self._connect(self.last_server))
+        return self._backup
+
+    async def _failover(self, failed):
+        '''Move all further requests from the failed connection to the backup one'''
+        if self._file is not failed:
+            return
+        backup = self._backup_handle()
+        handle = await backup
+        if self._file is not failed:
+            # concurrent requests share the backup, the first one through moves
+            return
+        if self._backup is backup:
+            self._backup = None
+        old, self._file = self._file, handle
+        if len(self._urls) > 1:
+            self._current = (self._current + 1) % len(self._urls)
+        if old.is_open():
+            try:
+                old.close(timeout=self._timeout, callback=lambda *args: None)
+            except Exception:
+                pass
+
+    async def _fetch(self, name, priority, expires, **kwargs):
+        '''Make request name (read or vector_read) with hedging and retries, once the scheduler allows
+
+        expires is the deadline of the reads served by the request, set here as
+        the task may have been started from the context of another read.
+        '''
+        current_deadline.set(expires)
+        if self._scheduler is None:
+            return await self._retried(name, kwargs)
+        if 'chunks' in kwargs:
+            nbytes = sum(size for _, size in kwargs['chunks'])
+        else:
+            nbytes = kwargs['size']
+        async with self._scheduler.request(nbytes, priority):
+            return await self._retried(name, kwargs)
+
+    async def _retried(self, name, kwargs):
+        for attempt in range(self._retries + 1):
+            handle = self._file
+            try:
+                return await self._hedged(name, kwargs)
+            except IOError:
+                if attempt == self._retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self._backoff * 2**attempt)
+                try:
+                    await self._failover(handle)
+                except IOError:
+                    # no other connection available, retry the current one
+                    pass
+
+    async def _hedged(self, name, kwargs):
+        start = self._loop.time()
+        primary = self._request(getattr(self._file, name), **kwargs)
+        deadline = None
+        if self._hedge_quantile is not None:
+            deadline = self._latency.quantile(self._hedge_quantile)
+        if deadline is None:
+            result = await primary
+            self._latency.add(self._loop.time() - start)
+            return result
+
+        done, _ = await asyncio.wait([primary], timeout=max(deadline, self._hedge_min))
+        if not done:
+            self.hedges += 1
+            backup = asyncio.ensure_future(self._hedge(name, kwargs))
+            done, pending = await asyncio.wait([primary, backup], return_when=asyncio.FIRST_COMPLETED)
+            first = done.pop()
+            if first.exception() is not None and pending:
+                # one failed, the other may still succeed
+                first = pending.pop()
+                await asyncio.wait([first])
+            for request in (primary, backup):
+                if request is not first:
+                    request.cancel()
+            if first is backup:
+                self.hedge_wins += 1
+            primary = first
+        result = primary.result()
+        self._latency.add(self._loop.time() - start)
+        return result
+
+    async def _hedge(self, name, kwargs):
+        handle = await self._backup_handle()
+        return await self._request(getattr(handle, name), **kwargs)
+
+    def _request(self, method, **kwargs):
         future = self._loop.create_future()
-        res = self._file.stat(timeout=self._timeout, callback=partial(self._handle, future))
+        span = tracer.span('xrootd.' + method.__name__, self.stats, url=self._url)
+        if 'chunks' in kwargs:
+            span.attrs['nchunks'] = len(kwargs['chunks'])
+            span.attrs['size'] = sum(size for _, size in kwargs['chunks'])
+        elif 'size' in kwargs:
+            span.attrs['offset'] = kwargs['offset']
+            span.attrs['size'] = kwargs['size']
+        res = method(timeout=request_timeout(self._timeout), callback=partial(self._handle, future, span), **kwargs)
         if not res['ok']:
-            raise IOError(res['message'].strip())
-        return await future
+            exc = IOError(res['message'].strip())
+            span.finish(exc)
+            raise exc
+        return future
+
+    async def stat(self):
+        return await self._request(self._file.stat)
 
     async def read(self, offset, size):
+        with tracer.span('read', self.stats, url=self._url, offset=offset, size=size):
+            if self._cache is not None:
+                return await self._cache.read(self._url, offset, size, self._read)
+            return await self._read(offset, size)
+
+    async def _read(self, offset, size):
+        if self._coalesce_gap is None:
+            return await self._fetch('read', io_priority.get(), current_deadline.get(), offset=offset, size=size)
         future = self._loop.create_future()
-        res = self._file.read(offset=offset, size=size, timeout=self._timeout, callback=partial(self._handle, future))
-        if not res['ok']:
-            raise IOError(res['message'].strip())
+        if not self._pending:
+            self._loop.call_soon(self._flush)
+        self._pending.append((offset, size, future, io_priority.get(), current_deadline.get()))
         return await future
 
-    async def __aenter__(self):
-        return await self.open()
+    def _flush(self):
+        pending = sorted((p for p in self._pending if not p[2].done()), key=lambda p: p[0])
+        self._pending = []
+        # [start, stop, reads, priority, expires], a merged read goes at the most urgent priority
+        # of its parts and lasts until the latest of their deadlines
+        groups = []
+        for offset, size, future, priority, expires in pending:
+            if groups:
+                group = groups[-1]
+                start, stop, reads, _, _ = group
+                if offset <= stop + self._coalesce_gap and max(stop, offset + size) - start <= self._vector_maxchunksize:
+                    group[1] = max(stop, offset + size)
+                    group[3] = min(group[3], priority)
+                    group[4] = None if expires is None or group[4] is None else max(group[4], expires)
+                    reads.append((offset, size, future))
+                    continue
+            groups.append([offset, offset + size, [(offset, size, future)], priority, expires])
+
+        vector = [g for g in groups if g[1] - g[0] <= self._vector_maxchunksize]
+        single = [g for g in groups if g[1] - g[0] > self._vector_maxchunksize]
+        if len(vector) == 1:
+            single.extend(vector)
+            vector = []
+        for group in single:
+            self._submit('read', False, [group], offset=group[0], size=group[1] - group[0])
+        for i in range(0, len(vector), self._vector_maxchunks):
+            batch = vector[i:i + self._vector_maxchunks]
+            self._submit('vector_read', True, batch, chunks=[(g[0], g[1] - g[0]) for g in batch])
+
+    def _submit(self, name, vector, groups, **kwargs):
+        priority = min(group[3] for group in groups)
+        expires = None
+        if all(group[4] is not None for group in groups):
+            expires = max(group[4] for group in groups)
+        request = asyncio.ensure_future(self._fetch(name, priority, expires, **kwargs))
+        request.add_done_callback(partial(self._distribute, vector, groups))
+        futures = [future for group in groups for _, _, future in group[2]]
+        for future in futures:
+            future.add_done_callback(partial(self._abandon, request, futures))
 
-    async def __aexit__(self, exc_type, exc, tb):
-        # could pass lost connection exception for example
-        return await self.close()
+    def _abandon(self, request, futures, _):
+        # once every read it serves is cancelled, stop waiting on the request and give back its scheduler grant
+        if not request.done() and all(future.done() for future in futures):
+            request.cancel()
+
+    def _distribute(self, vector, groups, request):
+        if request.cancelled():
+            # abandoned, every read it served is already done; counted here as _abandon runs once per read
+            self.abandoned += 1
+            return
+        exc = request.exception()
+        if exc is None:
+            content = request.result()
+            if vector:
+                buffers = [chunk['buffer'] for chunk in content['chunks']]
+            else:
+                buffers = [content]
+        for i, (start, _, reads, _, _) in enumerate(groups):
+            for offset, size, future in reads:
+                if future.done():
+                    continue
+                if exc is not None:
+                    future.set_exception(exc)
+                elif len(reads) == 1 and offset == start:
+                    future.set_result(buffers[i])
+                else:
+                    future.set_result(memoryview(buffers[i])[offset - start:offset - start + size])
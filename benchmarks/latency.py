@@ -0,0 +1,51 @@
+import random
+import asyncio
+from aioroot import ByteSource, LocalFile
+
+
+class LatencySource(ByteSource):
+    '''Local file served with the timing of a remote server, to benchmark offline
+
+    Every request costs one round trip of rtt seconds, stretched by up to
+    jitter times rtt at random, and its bytes go through a link of bandwidth
+    bytes/s that is shared by all requests of the source, so that concurrent
+    reads queue behind each other as they would on a real connection.  As with
+    xrootd, open costs a round trip and stat is answered from the open.
+    '''
+    def __init__(self, url, rtt=0.05, bandwidth=100e6, jitter=0.1, seed=None):
+        super().__init__(url)
+        self._local = LocalFile(url)
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._linkfree = 0.
+        self.requests = 0
+        self.bytes = 0
+
+    async def _roundtrip(self, size=0):
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        rtt = self.rtt * (1 + self.jitter * self._random.random())
+        # request reaches the server after half a round trip, then waits for the link
+        start = max(now + rtt / 2, self._linkfree)
+        self._linkfree = start + size / self.bandwidth
+        self.requests += 1
+        self.bytes += size
+        await asyncio.sleep(self._linkfree + rtt / 2 - now)
+
+    async def open(self):
+        await self._local.open()
+        await self._roundtrip()
+        return self
+
+    async def close(self):
+        await self._local.close()
+
+    async def stat(self):
+        return await self._local.stat()
+
+    async def read(self, offset, size):
+        data = await self._local.read(offset, size)
+        await self._roundtrip(len(data))
+        return data
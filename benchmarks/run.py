@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+'''Offline benchmarks of aioroot on synthetic files and a simulated remote server
+
+Scenarios:
+  open        time and round trips to open files of several kinds, with and without a tail read
+  numentries  bulk numentries over many files at several concurrencies
+  keylist     parsing speed of a large keys list
+  decompress  uncompressed throughput of reading tree branches per compression algorithm
+'''
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from aioroot import ROOTFile, numentries
+from aioroot.structure import TKeyList
+import synthetic
+from latency import LatencySource
+
+
+def report(scenario, case, value, unit):
+    print("%-12s %-40s %12.3f %s" % (scenario, case, value, unit))
+
+
+async def bench_open(args, threadpool):
+    files = {
+        'small': synthetic.write(synthetic.filename(args.workdir, 'small', 'zlib')),
+        'small, 10k keys': synthetic.write(synthetic.filename(args.workdir, 'small', 'zlib', 10000), nkeys=10000),
+        'big': synthetic.write(synthetic.filename(args.workdir, args.size, 'zlib'), size=args.size),
+    }
+    for name, path in files.items():
+        for tailsize in (None, 64 * 1024):
+            elapsed = []
+            for _ in range(args.repeat):
+                source = LatencySource(path, args.rtt, args.bandwidth, args.jitter, args.seed)
+                tic = time.perf_counter()
+                async with ROOTFile(source, threadpool=threadpool, open_tailsize=tailsize) as fin:
+                    await fin[b'Events']
+                elapsed.append(time.perf_counter() - tic)
+            case = '%s, tail %s' % (name, tailsize)
+            report('open', case, 1e3 * min(elapsed), 'ms (best of %d)' % args.repeat)
+            report('open', case, source.requests, 'requests (open, metadata and tree)')
+
+
+async def bench_numentries(args, threadpool):
+    path = synthetic.write(synthetic.filename(args.workdir, 'small', 'zlib'))
+    for concurrency in (1, 8, 64):
+        sources = [LatencySource(path, args.rtt, args.bandwidth, args.jitter, args.seed) for _ in range(args.nfiles)]
+        tic = time.perf_counter()
+        async for source, entries in numentries(sources, b'Events', concurrency=concurrency, threadpool=threadpool):
+            if isinstance(entries, Exception):
+                raise entries
+        elapsed = time.perf_counter() - tic
+        report('numentries', '%d files, concurrency %d' % (args.nfiles, concurrency), args.nfiles / elapsed, 'files/s')
+
+
+async def bench_keylist(args, threadpool):
+    path = synthetic.write(synthetic.filename(args.workdir, 'small', 'zlib', args.nkeys), nkeys=args.nkeys)
+    async with ROOTFile(path, threadpool=threadpool) as fin:
+        keysbytes = bytes(await fin._file.read(fin.rootdir.data['fSeekKeys'], fin.rootdir.data['fNbytesKeys']))
+    elapsed = []
+    for _ in range(args.repeat):
+        tic = time.perf_counter()
+        keyslist = TKeyList()
+        keyslist.read(keysbytes)
+        elapsed.append(time.perf_counter() - tic)
+    report('keylist', 'parse %d keys' % len(keyslist), 1e6 * min(elapsed) / len(keyslist), 'us/key')
+    tic = time.perf_counter()
+    for name in keyslist.names:
+        keyslist.key(keyslist.row(name))
+    report('keylist', 'lookup and build %d keys' % len(keyslist), 1e6 * (time.perf_counter() - tic) / len(keyslist), 'us/key')
+
+
+async def bench_decompress(args, threadpool):
+    for compression in ('none', 'zlib', 'lz4', 'lzma'):
+        path = synthetic.write(synthetic.filename(args.workdir, args.size, compression), size=args.size, compression=compression)
+        elapsed = []
+        for _ in range(args.repeat):
+            async with ROOTFile(path, threadpool=threadpool) as fin:
+                tree = await fin[b'Events']
+                tic = time.perf_counter()
+                arrays = await asyncio.gather(*(tree.array(name) for name in (b'run', b'pt', b'eta')))
+                elapsed.append(time.perf_counter() - tic)
+        nbytes = sum(a.nbytes for a in arrays)
+        report('decompress', compression, nbytes / min(elapsed) / 1e6, 'MB/s (best of %d)' % args.repeat)
+
+
+Scenarios = {
+    'open': bench_open,
+    'numentries': bench_numentries,
+    'keylist': bench_keylist,
+    'decompress': bench_decompress,
+}
+
+
+async def main(args):
+    os.makedirs(args.workdir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=args.threads) as threadpool:
+        for scenario in args.scenarios or sorted(Scenarios):
+            await Scenarios[scenario](args, threadpool)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', help='any of %s, default all' % ', '.join(sorted(Scenarios)))
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'aioroot-bench'), help='where synthetic files are kept')
+    parser.add_argument('--rtt', type=float, default=0.05, help='simulated round trip time (s)')
+    parser.add_argument('--bandwidth', type=float, default=100e6, help='simulated bandwidth (bytes/s)')
+    parser.add_argument('--jitter', type=float, default=0.1, help='random extra round trip time, as a fraction of rtt')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the jitter')
+    parser.add_argument('--size', choices=sorted(synthetic.Sizes), default='big', help='tree size for the big file and decompress scenarios')
+    parser.add_argument('--nfiles', type=int, default=200)
+    parser.add_argument('--nkeys', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=4, help='decompression threadpool size')
+    args = parser.parse_args()
+    for scenario in args.scenarios:
+        if scenario not in Scenarios:
+            parser.error("unknown scenario %r" % scenario)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main(args))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+'''Write synthetic ROOT files for the benchmarks, using uproot
+
+Files are named after their parameters and only written if missing, so a
+work directory can be reused between runs.
+
+uproot writes the keys list of the top directory and the TStreamerInfo record
+near the start of the file, where ROOT writes them at the end when it closes a
+file.  Both are moved to the end after writing (see move_to_end), so that the
+open benchmark sees the layout of files written by ROOT, which is what tail
+reads are for.
+'''
+import os
+import struct
+import argparse
+import numpy
+import awkward
+import uproot
+
+
+Compressions = {
+    'none': None,
+    'zlib': uproot.ZLIB(4),
+    'lzma': uproot.LZMA(4),
+    'lz4': uproot.LZ4(4),
+}
+
+# (number of entries, entries per basket) of the Events tree
+Sizes = {
+    'small': (10000, 10000),
+    'big': (2000000, 100000),
+}
+
+
+def filename(workdir, size='small', compression='zlib', nkeys=0, depth=0):
+    return os.path.join(workdir, 'synthetic_%s_%s_k%d_d%d.root' % (size, compression, nkeys, depth))
+
+
+def write(path, size='small', compression='zlib', nkeys=0, depth=0, seed=42):
+    '''Write an Events tree, nkeys histograms spread over directories depth deep, and return path
+
+    The tree has fixed-size float, double and integer branches and a jagged one,
+    written in baskets of the entries per basket of its size.
+    '''
+    if os.path.exists(path):
+        return path
+    nentries, basketsize = Sizes[size]
+    rng = numpy.random.default_rng(seed)
+    tmppath = path + '.tmp'
+    with uproot.recreate(tmppath, compression=Compressions[compression]) as fout:
+        fout.mktree('Events', {
+            'run': 'i4',
+            'pt': 'f4',
+            'eta': 'f8',
+            'hits': 'var * float32',
+        })
+        for start in range(0, nentries, basketsize):
+            n = min(basketsize, nentries - start)
+            counts = rng.poisson(4, n)
+            fout['Events'].extend({
+                'run': numpy.full(n, 1, dtype='i4'),
+                'pt': rng.exponential(20., n).astype('f4'),
+                'eta': rng.normal(0., 2., n),
+                'hits': awkward.unflatten(rng.normal(size=counts.sum()).astype('f4'), counts),
+            })
+        for i in range(nkeys):
+            directory = '/'.join('d%d' % (i % (j + 2)) for j in range(depth))
+            name = (directory + '/' if directory else '') + 'h%d' % i
+            fout[name] = numpy.histogram(rng.normal(size=100), bins=20, range=(-3, 3))
+    move_to_end(tmppath)
+    os.rename(tmppath, path)
+    return path
+
+
+def _patch(fout, position, fmt, value):
+    fout.seek(position)
+    fout.write(struct.pack(fmt, value))
+
+
+def _append_key(fout, seek, nbytes):
+    '''Copy the key record at seek to the end of the file, fixing its fSeekKey, and return the new seek'''
+    fout.seek(seek)
+    record = fout.read(nbytes)
+    newseek = fout.seek(0, os.SEEK_END)
+    fout.write(record)
+    version, = struct.unpack_from('>h', record, 4)
+    # fSeekKey follows fNbytes, fVersion, fObjlen, fDatime, fKeylen and fCycle
+    _patch(fout, newseek + 18, '>q' if version > 1000 else '>i', newseek)
+    return newseek
+
+
+def move_to_end(path):
+    '''Move the top keys list and TStreamerInfo record of a file written by uproot to its end
+
+    The old records are left in place, unreferenced.  The free segments record
+    is not updated, so the result is for reading only.
+    '''
+    with open(path, 'r+b') as fout:
+        magic, version, begin = struct.unpack('>4sii', fout.read(12))
+        if magic != b'root':
+            raise ValueError("%s is not a ROOT file" % path)
+        big = version >= 1000000
+        header = struct.Struct('>qqiiiBiqi' if big else '>iiiiiBiii')
+        fEND, _, _, _, nbytesname, _, _, seekinfo, nbytesinfo = header.unpack(fout.read(header.size))
+        if fout.seek(0, os.SEEK_END) != fEND:
+            raise ValueError("%s has data past fEND" % path)
+
+        # the root directory record follows its key and name, fSeekKeys is its last seek
+        directory = begin + nbytesname
+        fout.seek(directory)
+        dirversion, _, _, nbyteskeys = struct.unpack('>hIIi', fout.read(14))
+        seekkeys_at = directory + 18 + (16 if dirversion > 1000 else 8)
+        fout.seek(seekkeys_at)
+        seekkeys, = struct.unpack('>q' if dirversion > 1000 else '>i', fout.read(8 if dirversion > 1000 else 4))
+
+        newinfo = _append_key(fout, seekinfo, nbytesinfo)
+        newkeys = _append_key(fout, seekkeys, nbyteskeys)
+        end = fout.seek(0, os.SEEK_END)
+        if not big and end >= 2 ** 31:
+            raise ValueError("%s is too large to move records to its end" % path)
+
+        _patch(fout, seekkeys_at, '>q' if dirversion > 1000 else '>i', newkeys)
+        # fEND and fSeekInfo of the file header
+        fmt = '>q' if big else '>i'
+        _patch(fout, 12, fmt, end)
+        _patch(fout, 45 if big else 37, fmt, newinfo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workdir', default='.')
+    parser.add_argument('--size', choices=sorted(Sizes), default='small')
+    parser.add_argument('--compression', choices=sorted(Compressions), default='zlib')
+    parser.add_argument('--nkeys', type=int, default=0)
+    parser.add_argument('--depth', type=int, default=0)
+    args = parser.parse_args()
+    path = filename(args.workdir, args.size, args.compression, args.nkeys, args.depth)
+    print(write(path, args.size, args.compression, args.nkeys, args.depth))
+
+
+if __name__ == '__main__':
+    main()
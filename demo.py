@@ -2,9 +2,8 @@
 import time
 import asyncio
 import uproot
-from functools import partial
 from concurrent.futures import ThreadPoolExecutor
-from aioroot import ROOTFile
+from aioroot import ROOTFile, numentries
 
 
 async def getentries(url, threadpool=None):
@@ -15,6 +14,11 @@ async def getentries(url, threadpool=None):
     return url, tree.data['fEntries']
 
 
+def uproot_numentries(url, treename):
+    with uproot.open(url) as file:
+        return file[treename].num_entries
+
+
 async def main():
     urls = [
         "root://eospublic.cern.ch//eos/opendata/cms/derived-data/AOD2NanoAODOutreachTool/DYJetsToLL.root",
@@ -35,19 +39,18 @@ async def main():
 
         entries_async = {}
         tic = time.time()
-        for result in asyncio.as_completed(map(partial(getentries, threadpool=threadpool), urls)):
-            url, entries = await result
+        async for url, entries in numentries(urls, b'Events', threadpool=threadpool):
             entries_async[url] = entries
         toc = time.time()
         print("Elapsed (async): %.2f s" % (toc - tic))
 
         # prime the plumbing
-        await asyncio.get_event_loop().run_in_executor(threadpool, uproot.numentries, urls[0], b'Events')
+        await asyncio.get_event_loop().run_in_executor(threadpool, uproot_numentries, urls[0], 'Events')
 
         entries_uproot = {}
         tic = time.time()
         for url in urls:
-            entries = await asyncio.get_event_loop().run_in_executor(threadpool, uproot.numentries, url, b'Events')
+            entries = await asyncio.get_event_loop().run_in_executor(threadpool, uproot_numentries, url, 'Events')
             entries_uproot[url] = entries
         toc = time.time()
         print("Elapsed (uproot): %.2f s" % (toc - tic))
@@ -31,8 +31,12 @@ setup(name="aioroot",
       license="BSD 3-clause",
       test_suite="tests",
       install_requires=[
-          "uproot",
+          "numpy",
+          "uproot>=4",
       ],
+      extras_require={
+          "benchmarks": ["awkward"],
+      },
       setup_requires=["flake8"] + pytest_runner,
       classifiers=[
           "Development Status :: 3 - Alpha",
@@ -0,0 +1,44 @@
+import numpy
+import pytest
+import uproot
+
+# entries per basket and number of baskets of the test tree
+BASKET = 250
+NBASKETS = 4
+
+
+@pytest.fixture(scope='session')
+def arrays():
+    '''Contents of the tree in treefile'''
+    n = BASKET * NBASKETS
+    return {
+        'x': numpy.arange(n, dtype='>f8') * 0.5,
+        'n': numpy.arange(n, dtype='>i4') - 100,
+        'v': numpy.arange(3 * n, dtype='>f4').reshape(n, 3),
+    }
+
+
+@pytest.fixture(scope='session')
+def treefile(tmp_path_factory, arrays):
+    '''A file with tree Events, one basket per extend call'''
+    path = str(tmp_path_factory.mktemp('data') / 'tree.root')
+    with uproot.recreate(path) as fout:
+        fout.mktree('Events', {'x': 'f8', 'n': 'i4', 'v': numpy.dtype(('f4', (3,)))})
+        for i in range(NBASKETS):
+            fout['Events'].extend({name: array[i * BASKET:(i + 1) * BASKET] for name, array in arrays.items()})
+    return path
+
+
+
+@pytest.fixture(scope='session')
+def histfile(tmp_path_factory):
+    '''A file with histograms at the top and in nested directories'''
+    path = str(tmp_path_factory.mktemp('data') / 'hist.root')
+    values = numpy.arange(5, dtype='f8') + 1
+    edges = numpy.linspace(0, 10, 6)
+    with uproot.recreate(path) as fout:
+        fout['h1'] = (values, edges)
+        fout['dir/h1'] = (2 * values, edges)
+        fout['dir/sub/h2'] = (numpy.arange(12, dtype='f8').reshape(3, 4), numpy.linspace(0, 3, 4), numpy.linspace(0, 4, 5))
+        fout['other/h1'] = (3 * values, edges)
+    return path
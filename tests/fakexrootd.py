@@ -0,0 +1,115 @@
+'''A stand-in for pyxrootd.client serving one in-memory file, for the XRootDFile tests
+
+As with the real client, every request returns at once and its callback is
+called later from another thread, with the status, the response and the list
+of hosts that handled it, each given as a new URL object.  Servers are set
+per host name: how long they take to answer (None never answers) and how many
+reads fail before they succeed.  A redirector host hands out its data servers
+in order, skipping those in the tried= of the url.
+'''
+import threading
+from urllib.parse import urlparse, parse_qs
+
+DATA = bytes(range(256)) * 1024
+
+
+class URL:
+    '''Like pyxrootd.client.URL, compared by identity'''
+    def __init__(self, url):
+        self._url = url
+        parsed = urlparse(url)
+        self.hostname = parsed.hostname
+        self.port = parsed.port or 1094
+        self.hostid = '%s:%d' % (self.hostname, self.port)
+
+    def __str__(self):
+        return self._url
+
+
+class Server:
+    def __init__(self, delay=0.001, failures=0):
+        # seconds, None, or a function of (method, kwargs) giving either
+        self.delay = delay
+        self.failures = failures
+
+
+class File:
+    # host name: Server
+    servers = {}
+    # redirector host name: data server host names
+    redirects = {}
+    # (method, server host name, kwargs) of every request, in order
+    requests = []
+    # (callback, args) of the requests never answered
+    unanswered = []
+
+    @classmethod
+    def reset(cls, servers=None, redirects=None):
+        cls.servers = servers if servers is not None else {'s1': Server()}
+        cls.redirects = redirects if redirects is not None else {}
+        cls.requests = []
+        cls.unanswered = []
+
+    def __init__(self):
+        self._server = None
+        self._redirector = None
+
+    def is_open(self):
+        return self._server is not None
+
+    def _answer(self, method, callback, ok, response, **kwargs):
+        server = self._server
+        File.requests.append((method, server, kwargs))
+        status = {'ok': ok, 'message': '' if ok else '[ERROR] %s failed on %s\n' % (method, server)}
+        hosts = [{'url': URL('root://%s:1094//file.root' % server)}]
+        if self._redirector is not None:
+            hosts.insert(0, {'url': URL('root://%s:1094//file.root' % self._redirector)})
+        delay = File.servers[server].delay
+        if callable(delay):
+            delay = delay(method, kwargs)
+        if delay is None:
+            File.unanswered.append((callback, (status, response, hosts)))
+        else:
+            timer = threading.Timer(delay, callback, (status, response, hosts))
+            timer.daemon = True
+            timer.start()
+        return {'ok': True, 'message': ''}
+
+    def open(self, url, timeout, callback):
+        parsed = urlparse(url)
+        tried = parse_qs(parsed.query).get('tried', [])
+        host = parsed.hostname
+        if host in File.redirects:
+            self._redirector = host
+            candidates = [server for server in File.redirects[host] if server not in tried]
+            if not candidates:
+                return {'ok': False, 'message': '[FATAL] No servers left for %s\n' % url}
+            host = candidates[0]
+        self._server = host
+        return self._answer('open', callback, True, None, url=url, timeout=timeout)
+
+    def close(self, timeout, callback):
+        result = self._answer('close', callback, True, None)
+        self._server = None
+        return result
+
+    def stat(self, timeout, callback):
+        return self._answer('stat', callback, True, {'size': len(DATA), 'modtime': 0, 'flags': 0, 'id': '0'})
+
+    def _fails(self):
+        server = File.servers[self._server]
+        if server.failures > 0:
+            server.failures -= 1
+            return True
+        return False
+
+    def read(self, offset, size, timeout, callback):
+        if self._fails():
+            return self._answer('read', callback, False, None, offset=offset, size=size, timeout=timeout)
+        return self._answer('read', callback, True, DATA[offset:offset + size], offset=offset, size=size, timeout=timeout)
+
+    def vector_read(self, chunks, timeout, callback):
+        if self._fails():
+            return self._answer('vector_read', callback, False, None, chunks=chunks, timeout=timeout)
+        response = {'chunks': [{'offset': o, 'length': n, 'buffer': DATA[o:o + n]} for o, n in chunks]}
+        return self._answer('vector_read', callback, True, response, chunks=chunks, timeout=timeout)
@@ -0,0 +1,156 @@
+import asyncio
+import pytest
+from aioroot.cache import BlockCache
+from aioroot.scheduler import bulk_reads
+
+DATA = bytes(range(256)) * 64
+
+
+class Source:
+    '''fetch for BlockCache.read, recording calls, optionally held until released'''
+    def __init__(self, hold=False):
+        self.calls = []
+        self.cancelled = 0
+        self.release = asyncio.Event()
+        if not hold:
+            self.release.set()
+
+    async def fetch(self, offset, size):
+        self.calls.append((offset, size))
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return DATA[offset:offset + size]
+
+
+def _cache(**options):
+    options.setdefault('blocksize', 100)
+    return BlockCache(**options)
+
+
+def test_blocks():
+    cache = _cache()
+
+    async def main():
+        source = Source()
+        first = await cache.read('url', 150, 100, source.fetch)
+        again = await cache.read('url', 160, 30, source.fetch)
+        other = await cache.read('other', 160, 30, source.fetch)
+        return source.calls, bytes(first), bytes(again), bytes(other)
+
+    calls, first, again, other = asyncio.run(main())
+    assert (first, again, other) == (DATA[150:250], DATA[160:190], DATA[160:190])
+    # blocks 1 and 2 fetched as one run, then served from the cache; other urls have their own blocks
+    assert calls == [(100, 200), (100, 100)]
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'shared': 0, 'evictions': 0, 'blocks': 3, 'nbytes': 300}
+
+
+def test_missing_runs():
+    cache = _cache()
+
+    async def main():
+        source = Source()
+        await cache.read('url', 200, 10, source.fetch)
+        data = await cache.read('url', 50, 400, source.fetch)
+        return source.calls, bytes(data)
+
+    calls, data = asyncio.run(main())
+    assert data == DATA[50:450]
+    assert calls == [(200, 100), (0, 200), (300, 200)]
+
+
+def test_lru_eviction():
+    cache = _cache(maxbytes=200)
+
+    async def main():
+        source = Source()
+        for offset in (0, 100, 0, 200, 0, 100):
+            await cache.read('url', offset, 10, source.fetch)
+        return source.calls
+
+    # block 1 was the least recently used when block 2 came in
+    assert asyncio.run(main()) == [(0, 100), (100, 100), (200, 100), (100, 100)]
+    assert cache.evictions == 2
+    assert cache.nbytes == 200
+
+
+def test_shared_fetch():
+    cache = _cache()
+
+    async def main():
+        source = Source(hold=True)
+        readers = [asyncio.ensure_future(cache.read('url', 10 * i, 10, source.fetch)) for i in range(5)]
+        await asyncio.sleep(0)
+        source.release.set()
+        return source.calls, [bytes(data) for data in await asyncio.gather(*readers)]
+
+    calls, data = asyncio.run(main())
+    assert calls == [(0, 100)]
+    assert data == [DATA[10 * i:10 * i + 10] for i in range(5)]
+    assert (cache.misses, cache.shared) == (1, 4)
+
+
+def test_cancel_one_reader():
+    cache = _cache()
+
+    async def main():
+        source = Source(hold=True)
+        first = asyncio.ensure_future(cache.read('url', 0, 10, source.fetch))
+        second = asyncio.ensure_future(cache.read('url', 20, 10, source.fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        source.release.set()
+        data = bytes(await second)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return source, data
+
+    source, data = asyncio.run(main())
+    # the shielded fetch carried on for the other reader
+    assert data == DATA[20:30]
+    assert (source.calls, source.cancelled) == ([(0, 100)], 0)
+    assert cache.stats()['blocks'] == 1
+
+
+def test_cancel_all_readers():
+    cache = _cache()
+
+    async def main():
+        source = Source(hold=True)
+        readers = [asyncio.ensure_future(cache.read('url', offset, 10, source.fetch)) for offset in (0, 20)]
+        await asyncio.sleep(0)
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        await asyncio.sleep(0)
+        cancelled = source.cancelled
+        # nothing left in flight, so the block is fetched again
+        source.release.set()
+        data = bytes(await cache.read('url', 0, 10, source.fetch))
+        return source.calls, cancelled, data
+
+    calls, cancelled, data = asyncio.run(main())
+    assert cancelled == 1
+    assert calls == [(0, 100), (0, 100)]
+    assert data == DATA[:10]
+
+
+def test_bypass():
+    cache = _cache(bypass_size=150)
+
+    async def main():
+        source = Source()
+        large = await cache.read('url', 0, 151, source.fetch)
+        with bulk_reads():
+            bulk = await cache.read('url', 10, 10, source.fetch)
+        small = await cache.read('url', 10, 150, source.fetch)
+        return source.calls, bytes(large), bytes(bulk), bytes(small)
+
+    calls, large, bulk, small = asyncio.run(main())
+    assert (large, bulk, small) == (DATA[:151], DATA[10:20], DATA[10:160])
+    # only the last read goes through blocks
+    assert calls == [(0, 151), (10, 10), (0, 200)]
+    assert cache.stats()['misses'] == 2
@@ -0,0 +1,49 @@
+import asyncio
+import numpy
+import pytest
+from aioroot import Dataset
+from conftest import BASKET, NBASKETS
+
+
+@pytest.fixture
+def dataset(treefile):
+    dataset = Dataset(b'Events')
+    failed = asyncio.run(dataset.add([treefile, 'missing.root', treefile]))
+    assert list(failed) == ['missing.root']
+    return dataset
+
+
+def test_add(dataset, treefile):
+    nentries = BASKET * NBASKETS
+    assert dataset.urls == [treefile]
+    assert dataset.numentries == nentries
+    assert asyncio.run(dataset.add([treefile])) == {}
+    assert len(dataset) == 1
+    numpy.testing.assert_array_equal(dataset.file_clusters(0), [BASKET * i for i in range(NBASKETS + 1)])
+    assert dataset.locate(nentries - 1) == (treefile, nentries - 1)
+    with pytest.raises(IndexError):
+        dataset.locate(nentries)
+
+
+def test_round_trip(dataset, treefile, tmp_path):
+    path = str(tmp_path / 'index.npz')
+    dataset.save(path)
+    loaded = Dataset.load(path)
+    assert loaded.treename == dataset.treename
+    assert loaded.urls == dataset.urls
+    for name in ('offsets', 'clusters', 'cluster_offsets'):
+        numpy.testing.assert_array_equal(getattr(loaded, name), getattr(dataset, name))
+    assert list(loaded.partition(2 * BASKET)) == list(dataset.partition(2 * BASKET))
+    # a loaded index knows its files and can be extended
+    assert asyncio.run(loaded.add([treefile])) == {}
+    assert len(loaded) == 1
+
+
+def test_partition():
+    dataset = Dataset(b'Events')
+    dataset._append([('a.root', numpy.array([0, 10, 20, 25])), ('b.root', numpy.array([0, 7]))])
+    assert dataset.numentries == 32
+    assert list(dataset.partition(15)) == [('a.root', 0, 20), ('a.root', 20, 25), ('b.root', 0, 7)]
+    index, local = dataset.locate_array([0, 24, 25, 31])
+    numpy.testing.assert_array_equal(index, [0, 0, 1, 1])
+    numpy.testing.assert_array_equal(local, [0, 24, 0, 6])
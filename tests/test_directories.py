@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+import aioroot
+
+
+def test_walk(histfile):
+    async def main():
+        async with aioroot.ROOTFile(histfile) as rootfile:
+            return [(path, list(keyslist)) async for path, keyslist in rootfile.walk()]
+
+    assert asyncio.run(main()) == [
+        (b'', [b'h1;1', b'dir;1', b'other;1']),
+        (b'dir', [b'h1;1', b'sub;1']),
+        (b'other', [b'h1;1']),
+        (b'dir/sub', [b'h2;1']),
+    ]
+
+
+def test_paths(histfile):
+    async def main():
+        async with aioroot.ROOTFile(histfile) as rootfile:
+            nested = await rootfile[b'/dir/sub/h2']
+            directory = await rootfile[b'dir']
+            # concurrent lookups share the read of each subdirectory
+            again = await asyncio.gather(*(rootfile[b'dir/sub'] for _ in range(5)))
+            return nested, directory, again
+
+    nested, directory, again = asyncio.run(main())
+    assert nested.name == b'h2'
+    assert list(directory.keyslist) == [b'h1;1', b'sub;1']
+    assert all(sub is again[0] for sub in again)
+
+
+@pytest.mark.parametrize('path', [b'nope', b'dir/nope', b'nope/h1', b'h1/nope'])
+def test_missing(histfile, path):
+    async def main():
+        async with aioroot.ROOTFile(histfile) as rootfile:
+            return await rootfile[path]
+
+    with pytest.raises(KeyError):
+        asyncio.run(main())
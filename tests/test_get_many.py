@@ -0,0 +1,26 @@
+import asyncio
+import numpy
+import aioroot
+
+
+def test_get_many(histfile):
+    async def main():
+        async with aioroot.ROOTFile(histfile) as rootfile:
+            return await rootfile.get_many([b'other/h1', b'h1', b'dir/h1'])
+
+    other, h1, dirh1 = asyncio.run(main())
+    assert [h.name for h in (other, h1, dirh1)] == [b'h1'] * 3
+    numpy.testing.assert_array_equal(other.values, 3 * h1.values)
+    numpy.testing.assert_array_equal(dirh1.values, 2 * h1.values)
+
+
+def test_get_many_separate_reads(histfile):
+    async def main():
+        async with aioroot.ROOTFile(histfile) as rootfile:
+            merged = await rootfile.get_many([b'h1', b'dir/sub/h2'])
+            single = await rootfile.get_many([b'h1', b'dir/sub/h2'], gap=0, max_readsize=1)
+            return merged, single
+
+    merged, single = asyncio.run(main())
+    for a, b in zip(merged, single):
+        numpy.testing.assert_array_equal(a.values, b.values)
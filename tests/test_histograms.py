@@ -0,0 +1,28 @@
+import asyncio
+import numpy
+import aioroot
+
+
+async def _read(path, *keynames):
+    async with aioroot.ROOTFile(path) as rootfile:
+        return [await rootfile[name] for name in keynames]
+
+
+def test_th1(histfile):
+    h1, dirh1 = asyncio.run(_read(histfile, b'h1', b'dir/h1'))
+    assert isinstance(h1, aioroot.structure.TH1D)
+    assert h1.name == b'h1'
+    assert h1.histdata['fEntries'] == 15
+    numpy.testing.assert_array_equal(h1.values, [0, 1, 2, 3, 4, 5, 0])
+    numpy.testing.assert_array_equal(dirh1.values[1:-1], [2, 4, 6, 8, 10])
+    xaxis, = h1.axes
+    assert (xaxis.data['fNbins'], xaxis.data['fXmin'], xaxis.data['fXmax']) == (5, 0, 10)
+
+
+def test_th2(histfile):
+    h2, = asyncio.run(_read(histfile, b'dir/sub/h2'))
+    assert isinstance(h2, aioroot.structure.TH2D)
+    assert [axis.data['fNbins'] for axis in h2.axes] == [3, 4]
+    assert h2.values.shape == (5, 6)
+    numpy.testing.assert_array_equal(h2.values[1:-1, 1:-1], numpy.arange(12).reshape(3, 4))
+    assert h2.values.sum() == numpy.arange(12).sum()
@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+import aioroot
+
+
+async def _keyslist(path):
+    async with aioroot.ROOTFile(path) as rootfile:
+        return rootfile.keyslist
+
+
+def test_keys(treefile, histfile):
+    async def main():
+        async with aioroot.ROOTFile(treefile) as rootfile:
+            treekeys = list(rootfile.keys())
+        async with aioroot.ROOTFile(histfile) as rootfile:
+            histkeys = list(rootfile.keys())
+        return treekeys, histkeys
+
+    treekeys, histkeys = asyncio.run(main())
+    assert treekeys == [b'Events;1']
+    assert sorted(histkeys) == [b'dir;1', b'h1;1', b'other;1']
+
+
+def test_keyslist_lookup(histfile):
+    keyslist = asyncio.run(_keyslist(histfile))
+    assert len(keyslist) == 3
+    assert b'h1' in keyslist and b'h1;1' in keyslist
+    assert b'h1;2' not in keyslist and b'nope' not in keyslist
+    key = keyslist[b'h1']
+    assert key is keyslist[b'h1;1']
+    assert (key.data['fName'], key.data['fClassName'], key.data['fCycle']) == (b'h1', b'TH1D', 1)
+    assert keyslist[b'dir'].data['fClassName'] == b'TDirectory'
+    with pytest.raises(KeyError):
+        keyslist[b'h1;2']
@@ -0,0 +1,70 @@
+import os
+import asyncio
+import shutil
+import sqlite3
+import pytest
+import aioroot
+from aioroot import MetadataCache
+
+
+@pytest.fixture
+def copied(tmp_path, treefile):
+    path = str(tmp_path / 'tree.root')
+    shutil.copy(treefile, path)
+    return path
+
+
+def _open(path, metacache):
+    async def main():
+        async with aioroot.ROOTFile(path, metacache=metacache) as rootfile:
+            tree = await rootfile[b'Events']
+            return list(rootfile.keys()), tree.data['fEntries'], rootfile.open_roundtrips
+
+    return asyncio.run(main())
+
+
+def test_warm_open(tmp_path, copied):
+    metacache = MetadataCache(str(tmp_path / 'meta.db'))
+    cold = _open(copied, metacache)
+    warm = _open(copied, metacache)
+    assert cold == ([b'Events;1'], 1000, 2)
+    assert warm == ([b'Events;1'], 1000, 0)
+    assert (metacache.misses, metacache.hits) == (1, 1)
+    metacache.close()
+
+    # entries outlive the connection
+    metacache = MetadataCache(str(tmp_path / 'meta.db'))
+    assert _open(copied, metacache)[2] == 0
+    metacache.close()
+
+
+@pytest.mark.parametrize('change', ['modtime', 'size'])
+def test_invalidated(tmp_path, copied, change):
+    metacache = MetadataCache(str(tmp_path / 'meta.db'))
+    _open(copied, metacache)
+    if change == 'modtime':
+        st = os.stat(copied)
+        os.utime(copied, (st.st_atime, st.st_mtime + 10))
+    else:
+        with open(copied, 'ab') as fout:
+            fout.write(b'\0' * 100)
+    assert _open(copied, metacache) == ([b'Events;1'], 1000, 2)
+    # the cold open replaced the stale entry
+    assert _open(copied, metacache)[2] == 0
+    assert (metacache.misses, metacache.hits) == (2, 1)
+    metacache.close()
+
+
+def test_old_table_dropped(tmp_path, copied):
+    path = str(tmp_path / 'meta.db')
+    db = sqlite3.connect(path)
+    db.execute('CREATE TABLE metadata (url TEXT PRIMARY KEY, fEND INTEGER NOT NULL, modtime INTEGER NOT NULL, '
+               'fUUID BLOB NOT NULL, head BLOB NOT NULL, keys BLOB NOT NULL)')
+    db.execute("INSERT INTO metadata VALUES (?, 0, 0, x'00', x'00', x'00')", (copied,))
+    db.commit()
+    db.close()
+
+    metacache = MetadataCache(path)
+    assert _open(copied, metacache)[2] == 2
+    assert _open(copied, metacache)[2] == 0
+    metacache.close()
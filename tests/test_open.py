@@ -0,0 +1,20 @@
+import asyncio
+import pytest
+import aioroot
+
+
+@pytest.mark.parametrize('readstep, roundtrips', [(80, 4), (200, 3), (512, 2)])
+def test_open_past_first_read(treefile, readstep, roundtrips):
+    async def main():
+        rootfile = aioroot.ROOTFile(treefile)
+        rootfile._open_readstep = readstep
+        async with rootfile:
+            tree = await rootfile[b'Events']
+            return list(rootfile.keys()), tree.data['fEntries'], rootfile.open_roundtrips
+
+    if roundtrips > 2:
+        with pytest.warns(RuntimeWarning, match='Readahead too small'):
+            result = asyncio.run(main())
+    else:
+        result = asyncio.run(main())
+    assert result == ([b'Events;1'], 1000, roundtrips)
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import pytest
+from aioroot.scheduler import IOScheduler, bulk_reads, io_priority, META, BULK
+
+
+async def _hold(grant, log, name, event):
+    async with grant:
+        log.append(name)
+        await event.wait()
+
+
+async def _queue(scheduler, grants):
+    '''Hold a first grant, queue the others by name, release and return the order they were granted'''
+    log = []
+    release = asyncio.Event()
+    first = asyncio.ensure_future(_hold(scheduler.request(1, META), log, 'first', release))
+    await asyncio.sleep(0)
+    tasks = []
+    for name, grant in grants:
+        tasks.append(asyncio.ensure_future(_hold(grant, log, name, release)))
+        await asyncio.sleep(0)
+    assert log == ['first']
+    release.set()
+    await asyncio.gather(first, *tasks)
+    # budgets, and their counters, go away with the loop
+    return log[1:], scheduler.stats()
+
+
+def test_priority():
+    scheduler = IOScheduler(max_requests=1)
+    order, stats = asyncio.run(_queue(scheduler, [
+        ('bulk1', scheduler.request(1, BULK)),
+        ('meta1', scheduler.request(1, META)),
+        ('bulk2', scheduler.request(1, BULK)),
+        ('meta2', scheduler.request(1, META)),
+    ]))
+    # metadata first, then first come first served
+    assert order == ['meta1', 'meta2', 'bulk1', 'bulk2']
+    assert stats['request_waits'] == 4
+    assert stats['requests'] == 0
+
+
+def test_bulk_reads():
+    scheduler = IOScheduler(max_requests=1)
+
+    async def main():
+        assert io_priority.get() == META
+        with bulk_reads():
+            assert io_priority.get() == BULK
+            bulk = scheduler.request(1)
+        meta = scheduler.request(1)
+        order, _ = await _queue(scheduler, [('bulk', bulk), ('meta', meta)])
+        return order
+
+    assert asyncio.run(main()) == ['meta', 'bulk']
+
+
+def test_buffer_backpressure():
+    scheduler = IOScheduler(max_buffered_bytes=100)
+    log = []
+
+    async def main():
+        release = asyncio.Event()
+        first = asyncio.ensure_future(_hold(scheduler.buffer(60), log, 'first', release))
+        second = asyncio.ensure_future(_hold(scheduler.buffer(60), log, 'second', release))
+        small = asyncio.ensure_future(_hold(scheduler.buffer(40), log, 'small', release))
+        await asyncio.sleep(0.01)
+        # the second waits for bytes, and the small one does not overtake it
+        held = list(log), scheduler.stats()['buffered_bytes']
+        release.set()
+        await asyncio.gather(first, second, small)
+        return held, scheduler.stats()
+
+    (held, nbytes), stats = asyncio.run(main())
+    assert (held, nbytes) == (['first'], 60)
+    assert log == ['first', 'second', 'small']
+    assert stats['buffer_waits'] == 2
+    assert stats['peak_buffered_bytes'] == 100
+    assert stats['buffered_bytes'] == 0
+
+
+def test_oversized_grant():
+    scheduler = IOScheduler(max_inflight_bytes=100)
+
+    async def main():
+        async with scheduler.request(1000):
+            return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert stats['inflight_bytes'] == 1000
+    assert stats['request_waits'] == 0
+
+
+def test_cancelled_waiter():
+    scheduler = IOScheduler(max_requests=1)
+    log = []
+
+    async def main():
+        release = asyncio.Event()
+        first = asyncio.ensure_future(_hold(scheduler.request(1), log, 'first', release))
+        cancelled = asyncio.ensure_future(_hold(scheduler.request(1, META), log, 'cancelled', release))
+        later = asyncio.ensure_future(_hold(scheduler.request(1, BULK), log, 'later', release))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        release.set()
+        await asyncio.gather(first, later)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert log == ['first', 'later']
+    assert stats['requests'] == 0
+
+
+def test_budgets_per_loop():
+    # each loop has its own budget: with one request each, both threads hold one at once
+    scheduler = IOScheduler(max_requests=1)
+    barrier = threading.Barrier(2, timeout=5)
+    errors = []
+
+    stats = []
+
+    async def main():
+        async with scheduler.request(10):
+            await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+            stats.append(scheduler.stats())
+            await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+
+    def run():
+        try:
+            asyncio.run(main())
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    # stats sum over the loops
+    assert [s['requests'] for s in stats] == [2, 2]
+    assert [s['inflight_bytes'] for s in stats] == [20, 20]
+    assert [s['request_waits'] for s in stats] == [0, 0]
@@ -0,0 +1,39 @@
+import asyncio
+import aioroot
+from aioroot.source import LocalFile, source_for
+
+
+def test_local_source_is_zero_copy(treefile):
+    async def main():
+        source = source_for(treefile)
+        assert isinstance(source, LocalFile)
+        async with source:
+            stat = await source.stat()
+            head = await source.read(0, 4)
+            tail = await source.read(stat['size'] - 10, 100)
+            return stat, head, tail
+
+    stat, head, tail = asyncio.run(main())
+    assert isinstance(head, memoryview)
+    assert bytes(head) == b'root'
+    assert len(tail) == 10
+    assert stat['size'] > 0
+
+
+def test_rootfile_from_source(treefile):
+    async def main():
+        async with aioroot.ROOTFile(LocalFile('file://' + treefile)) as rootfile:
+            return list(rootfile.keys())
+
+    assert asyncio.run(main()) == [b'Events;1']
+
+
+def test_closed_source():
+    async def main():
+        source = LocalFile('missing.root')
+        try:
+            await source.read(0, 4)
+        except IOError:
+            return True
+
+    assert asyncio.run(main())
@@ -0,0 +1,109 @@
+import asyncio
+import numpy
+import pytest
+import aioroot
+from conftest import BASKET, NBASKETS
+
+
+async def _tree(path):
+    async with aioroot.ROOTFile(path) as rootfile:
+        return await rootfile[b'Events']
+
+
+def test_tree_versions(treefile):
+    tree = asyncio.run(_tree(treefile))
+    assert tree.data['fVersion'] in aioroot.structure.TTree.headers
+    assert tree.data['fEntries'] == BASKET * NBASKETS
+    branches = tree.branches
+    assert set(branches) == {b'x', b'n', b'v'}
+    for branch in branches.values():
+        assert branch.data['fVersion'] in (10, 11, 12, 13)
+        assert list(branch.basket_entry) == [BASKET * i for i in range(NBASKETS + 1)]
+        assert len(branch.basket_seek) == NBASKETS
+    assert list(tree.clusters()) == [BASKET * i for i in range(NBASKETS + 1)]
+
+
+def test_leaves(treefile):
+    tree = asyncio.run(_tree(treefile))
+    dtypes = {name: (branch.leaves[0].dtype.str, branch.leaves[0].leafdata['fLen']) for name, branch in tree.branches.items()}
+    assert dtypes == {b'x': ('>f8', 1), b'n': ('>i4', 1), b'v': ('>f4', 3)}
+
+
+@pytest.mark.parametrize('entry_start, entry_stop', [
+    (None, None),
+    (0, BASKET),
+    (10, 20),
+    (BASKET - 5, BASKET + 5),
+    (100, 3 * BASKET + 1),
+    (-10, 10 ** 6),
+    (500, 500),
+])
+def test_read_array(treefile, arrays, entry_start, entry_stop):
+    async def main():
+        async with aioroot.ROOTFile(treefile) as rootfile:
+            tree = await rootfile[b'Events']
+            return {name: await tree.array(name.encode(), entry_start, entry_stop) for name in arrays}
+
+    result = asyncio.run(main())
+    for name, expected in arrays.items():
+        expected = expected[max(entry_start or 0, 0):entry_stop]
+        assert result[name].dtype == expected.dtype.newbyteorder('=')
+        numpy.testing.assert_array_equal(result[name], expected)
+
+
+def test_read_array_embedded_baskets(treefile):
+    async def main():
+        async with aioroot.ROOTFile(treefile) as rootfile:
+            tree = await rootfile[b'Events']
+            # as if the last basket had been kept in memory with the tree
+            tree.branches[b'x'].branchdata['fWriteBasket'] -= 1
+            return await tree.array(b'x', 0, BASKET * NBASKETS)
+
+    with pytest.raises(NotImplementedError):
+        asyncio.run(main())
+
+
+def test_iterate(treefile, arrays):
+    async def main():
+        async with aioroot.ROOTFile(treefile) as rootfile:
+            tree = await rootfile[b'Events']
+            return [chunk async for chunk in tree.iterate([b'x', b'v'], step=2 * BASKET, prefetch=1)]
+
+    chunks = asyncio.run(main())
+    assert [len(chunk[b'x']) for chunk in chunks] == [2 * BASKET, 2 * BASKET]
+    numpy.testing.assert_array_equal(numpy.concatenate([chunk[b'x'] for chunk in chunks]), arrays['x'])
+    numpy.testing.assert_array_equal(numpy.concatenate([chunk[b'v'] for chunk in chunks]), arrays['v'])
+
+
+# one chunk of x is a basket of doubles
+CHUNK = BASKET * 8
+
+
+@pytest.mark.parametrize('max_bytes, peak', [(None, 4 * CHUNK), (1, CHUNK), (CHUNK, CHUNK), (2 * CHUNK + 100, 2 * CHUNK)])
+def test_iterate_max_bytes(treefile, arrays, max_bytes, peak):
+    held = [0, 0]
+
+    async def main():
+        async with aioroot.ROOTFile(treefile) as rootfile:
+            tree = await rootfile[b'Events']
+            read_array = rootfile.read_array
+
+            async def counted(tree, name, start, stop):
+                # bytes of chunks being read or read but not yet taken by the consumer
+                held[0] += (stop - start) * 8
+                held[1] = max(held)
+                return await read_array(tree, name, start, stop)
+
+            rootfile.read_array = counted
+            chunks = []
+            async for chunk in tree.iterate([b'x'], prefetch=3, max_bytes=max_bytes):
+                held[0] -= len(chunk[b'x']) * 8
+                chunks.append(chunk)
+                # a slow consumer, so that prefetching fills up
+                await asyncio.sleep(0.01)
+            return chunks
+
+    chunks = asyncio.run(main())
+    assert held[1] == peak
+    assert [len(chunk[b'x']) for chunk in chunks] == [BASKET] * NBASKETS
+    numpy.testing.assert_array_equal(numpy.concatenate([chunk[b'x'] for chunk in chunks]), arrays['x'])
@@ -0,0 +1,320 @@
+import sys
+import types
+import asyncio
+import pytest
+import fakexrootd
+from fakexrootd import DATA, Server
+from aioroot.scheduler import IOScheduler
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    '''fakexrootd installed as pyxrootd.client'''
+    client = types.ModuleType('pyxrootd.client')
+    client.File = fakexrootd.File
+    client.URL = fakexrootd.URL
+    package = types.ModuleType('pyxrootd')
+    package.client = client
+    monkeypatch.setitem(sys.modules, 'pyxrootd', package)
+    monkeypatch.setitem(sys.modules, 'pyxrootd.client', client)
+    fakexrootd.File.reset()
+    return fakexrootd.File
+
+
+def _open(url='root://s1//file.root', **options):
+    from aioroot.xrootd import XRootDFile
+    options.setdefault('cache', None)
+    options.setdefault('scheduler', IOScheduler())
+    options.setdefault('backoff', 0.001)
+    return XRootDFile(url, **options).open()
+
+
+def test_server_counts(fake):
+    async def main():
+        xfile = await _open()
+        data = [bytes(await xfile.read(i * 100, 10)) for i in range(20)]
+        await xfile.close()
+        return xfile, data
+
+    xfile, data = asyncio.run(main())
+    assert data == [DATA[i * 100:i * 100 + 10] for i in range(20)]
+    # one entry for the server however many URL objects named it
+    assert xfile.last_server == 's1:1094'
+    assert xfile.server_counts == {'s1:1094': 22}
+
+
+def test_server_after_redirect(fake):
+    fake.reset(servers={'s2': Server()}, redirects={'redir': ['s2']})
+
+    async def main():
+        xfile = await _open('root://redir//file.root')
+        await xfile.read(0, 10)
+        return xfile
+
+    xfile = asyncio.run(main())
+    assert xfile.last_server == 's2:1094'
+    assert set(xfile.server_counts) == {'s2:1094'}
+
+
+def _opened(fake):
+    return [kwargs['url'] for method, _, kwargs in fake.requests if method == 'open']
+
+
+def _slow_reads(delay):
+    return Server(delay=lambda method, kwargs: delay if method == 'read' else 0.001)
+
+
+def test_retry_same_server(fake):
+    fake.reset(servers={'s1': Server(failures=1)})
+
+    async def main():
+        xfile = await _open()
+        return xfile, bytes(await xfile.read(10, 10))
+
+    xfile, data = asyncio.run(main())
+    assert data == DATA[10:20]
+    assert xfile.retries == 1
+    # no replica and no redirector to avoid s1, so it is opened again
+    assert _opened(fake) == ['root://s1//file.root', 'root://s1//file.root?tried=s1']
+
+
+def test_failover_through_redirector(fake):
+    fake.reset(servers={'s1': Server(failures=100), 's2': Server()}, redirects={'redir': ['s1', 's2']})
+
+    async def main():
+        xfile = await _open('root://redir//file.root')
+        data = [bytes(await xfile.read(10, 10)), bytes(await xfile.read(50, 10))]
+        return xfile, data
+
+    xfile, data = asyncio.run(main())
+    assert data == [DATA[10:20], DATA[50:60]]
+    assert xfile.retries == 1
+    assert xfile.last_server == 's2:1094'
+    assert _opened(fake) == ['root://redir//file.root', 'root://redir//file.root?tried=s1']
+    # later reads stay on the new connection
+    assert [server for method, server, _ in fake.requests if method == 'read'] == ['s1', 's2', 's2']
+
+
+def test_failover_to_replica(fake):
+    fake.reset(servers={'s1': Server(failures=100), 's2': Server()})
+
+    async def main():
+        xfile = await _open(replicas=['root://s2//file.root'])
+        return xfile, bytes(await xfile.read(10, 10))
+
+    xfile, data = asyncio.run(main())
+    assert data == DATA[10:20]
+    assert xfile.last_server == 's2:1094'
+    assert _opened(fake) == ['root://s1//file.root', 'root://s2//file.root']
+
+
+def test_retries_exhausted(fake):
+    fake.reset(servers={'s1': Server(failures=100)})
+
+    async def main():
+        xfile = await _open(retries=2)
+        try:
+            await xfile.read(10, 10)
+        finally:
+            assert xfile.retries == 2
+
+    with pytest.raises(IOError, match='read failed on s1'):
+        asyncio.run(main())
+
+
+@pytest.mark.parametrize('replicas, url, backup', [
+    ((), 'root://redir//file.root', 'root://redir//file.root?tried=s1'),
+    (('root://s2//file.root',), 'root://s1//file.root', 'root://s2//file.root'),
+])
+def test_hedge(fake, replicas, url, backup):
+    from aioroot.xrootd import LatencyTracker
+    fake.reset(servers={'s1': _slow_reads(1.), 's2': Server()}, redirects={'redir': ['s1', 's2']})
+    latency = LatencyTracker()
+    for _ in range(32):
+        latency.add(0.001)
+
+    async def main():
+        xfile = await _open(url, replicas=replicas, hedge_quantile=0.9, hedge_min=0.02, latency=latency)
+        return xfile, bytes(await xfile.read(10, 10))
+
+    xfile, data = asyncio.run(main())
+    assert data == DATA[10:20]
+    assert (xfile.hedges, xfile.hedge_wins) == (1, 1)
+    assert _opened(fake) == [url, backup]
+    assert [server for method, server, _ in fake.requests if method == 'read'] == ['s1', 's2']
+
+
+def test_hedge_primary_wins(fake):
+    from aioroot.xrootd import LatencyTracker
+    fake.reset(servers={'s1': _slow_reads(0.05), 's2': _slow_reads(2.)}, redirects={'redir': ['s1', 's2']})
+    latency = LatencyTracker()
+    for _ in range(32):
+        latency.add(0.001)
+
+    async def main():
+        xfile = await _open('root://redir//file.root', hedge_quantile=0.9, hedge_min=0.01, latency=latency)
+        return xfile, bytes(await xfile.read(10, 10))
+
+    xfile, data = asyncio.run(main())
+    assert data == DATA[10:20]
+    assert (xfile.hedges, xfile.hedge_wins) == (1, 0)
+
+
+def _reads(fake):
+    return [(method, kwargs.get('chunks') or (kwargs['offset'], kwargs['size'])) for method, _, kwargs in fake.requests if 'read' in method]
+
+
+@pytest.mark.parametrize('gap, requests', [
+    (None, [('read', (4000, 10)), ('read', (0, 10)), ('read', (100000, 10)), ('read', (20, 10))]),
+    (0, [('vector_read', [(0, 10), (20, 10), (4000, 10), (100000, 10)])]),
+    (10, [('vector_read', [(0, 30), (4000, 10), (100000, 10)])]),
+    (4096, [('vector_read', [(0, 4010), (100000, 10)])]),
+    (10 ** 6, [('read', (0, 100010))]),
+])
+def test_coalesce(fake, gap, requests):
+    ranges = [(4000, 10), (0, 10), (100000, 10), (20, 10)]
+
+    async def main():
+        xfile = await _open(coalesce_gap=gap)
+        return await asyncio.gather(*(xfile.read(offset, size) for offset, size in ranges))
+
+    data = asyncio.run(main())
+    assert [bytes(d) for d in data] == [DATA[offset:offset + size] for offset, size in ranges]
+    assert _reads(fake) == requests
+
+
+def test_coalesce_limits(fake):
+    ranges = [(i * 1000, 10) for i in range(5)] + [(10000, 500)]
+
+    async def main():
+        xfile = await _open(coalesce_gap=0)
+        xfile._vector_maxchunks = 2
+        xfile._vector_maxchunksize = 100
+        return await asyncio.gather(*(xfile.read(offset, size) for offset, size in ranges))
+
+    data = asyncio.run(main())
+    assert [bytes(d) for d in data] == [DATA[offset:offset + size] for offset, size in ranges]
+    # too large for a vector read chunk, and at most two chunks per vector read
+    assert _reads(fake) == [
+        ('read', (10000, 500)),
+        ('vector_read', [(0, 10), (1000, 10)]),
+        ('vector_read', [(2000, 10), (3000, 10)]),
+        ('vector_read', [(4000, 10)]),
+    ]
+
+
+def test_coalesce_out_of_order(fake):
+    # later chunks answer first
+    fake.reset(servers={'s1': Server(delay=lambda method, kwargs: 0.001 if method == 'open' else 0.05 - kwargs['chunks'][0][0] / 1e5)})
+    ranges = [(i * 1000, 10) for i in range(4)]
+
+    async def main():
+        xfile = await _open(coalesce_gap=0)
+        xfile._vector_maxchunks = 1
+        order = []
+
+        async def read(offset, size):
+            data = await xfile.read(offset, size)
+            order.append(offset)
+            return data
+
+        data = await asyncio.gather(*(read(offset, size) for offset, size in ranges))
+        return order, data
+
+    order, data = asyncio.run(main())
+    assert order == [3000, 2000, 1000, 0]
+    assert [bytes(d) for d in data] == [DATA[offset:offset + size] for offset, size in ranges]
+
+
+def _answer_late(fake):
+    for callback, args in fake.unanswered:
+        callback(*args)
+    fake.unanswered.clear()
+
+
+def test_abandon(fake):
+    fake.reset(servers={'s1': Server(delay=lambda method, kwargs: 0.001 if method == 'open' else None)})
+    scheduler = IOScheduler()
+
+    async def main():
+        xfile = await _open(scheduler=scheduler)
+        reads = [asyncio.ensure_future(xfile.read(offset, 10)) for offset in (0, 20)]
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()['requests'] == 1
+        for read in reads:
+            read.cancel()
+        await asyncio.gather(*reads, return_exceptions=True)
+        await asyncio.sleep(0)
+        stats = scheduler.stats()
+        _answer_late(fake)
+        await asyncio.sleep(0.01)
+        return xfile, stats
+
+    xfile, stats = asyncio.run(main())
+    assert _reads(fake) == [('read', (0, 30))]
+    # the request was cancelled with its reads, giving back its grant, and its response dropped
+    assert xfile.abandoned == 1
+    assert stats['requests'] == 0
+    assert xfile.dropped == 1
+
+
+def test_abandon_partly(fake):
+    fake.reset(servers={'s1': Server(delay=lambda method, kwargs: 0.001 if method == 'open' else None)})
+
+    async def main():
+        xfile = await _open()
+        first, second = [asyncio.ensure_future(xfile.read(offset, 10)) for offset in (0, 20)]
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        _answer_late(fake)
+        return xfile, bytes(await second), first.cancelled()
+
+    xfile, data, cancelled = asyncio.run(main())
+    # still wanted by the second read
+    assert cancelled
+    assert data == DATA[20:30]
+    assert (xfile.abandoned, xfile.dropped) == (0, 0)
+
+
+@pytest.mark.parametrize('gap', [None, 4096])
+def test_deadline(fake, gap):
+    from aioroot import deadline
+    fake.reset(servers={'s1': Server(delay=lambda method, kwargs: 0.001 if method == 'open' else None)})
+    scheduler = IOScheduler()
+
+    async def main():
+        xfile = await _open(coalesce_gap=gap, scheduler=scheduler)
+        with pytest.raises(asyncio.TimeoutError):
+            with deadline(0.05):
+                await xfile.read(0, 10)
+        # the abandoned request unwinds in the following loop iterations
+        await asyncio.sleep(0.01)
+        stats = scheduler.stats()
+        _answer_late(fake)
+        await asyncio.sleep(0.01)
+        return xfile, stats
+
+    xfile, stats = asyncio.run(main())
+    # the request was given no more than the deadline left, in whole seconds
+    assert [kwargs['timeout'] for method, _, kwargs in fake.requests if method == 'read'] == [1]
+    assert xfile._pending == []
+    assert stats['requests'] == 0
+    assert xfile.abandoned == (1 if gap is not None else 0)
+    assert xfile.dropped == 1
+
+
+def test_open_deadline_closes(fake):
+    import aioroot
+    fake.reset(servers={'s1': Server(delay=lambda method, kwargs: 0.001 if method == 'close' else None)})
+
+    async def main():
+        from aioroot.xrootd import XRootDFile
+        xfile = XRootDFile('root://s1//file.root', cache=None, scheduler=IOScheduler())
+        with pytest.raises(asyncio.TimeoutError):
+            await aioroot.ROOTFile(xfile, timeout=0.05).open()
+        return xfile
+
+    xfile = asyncio.run(main())
+    assert [method for method, _, _ in fake.requests] == ['open', 'close']
+    assert xfile._file is None